@@ -1,12 +1,270 @@
-from flask import Flask, render_template, jsonify, request
+import os
+import time
+import tempfile
+import threading
+from flask import Flask, Response, abort, g, render_template, jsonify, request, stream_with_context, url_for
 from harmonizer import Harmonizer, Note, Voicer
 import audio_utils
+import oscillators
+from audio_cache import bar_cache, chord_cache, chord_key, key_digest
+from render_pool import render_scheduler
+from sequence_service import parse_note_sequence, sequence_renderer
+from harmony_table import HarmonyTable, default_path
+from sessions import MAX_TEMPO, MIN_TEMPO, SessionNotFound, session_store
+from timeline import Timeline, stream_timeline_audio
+import metrics
 
 app = Flask(__name__)
 
-def generate_audio_data(chord, sample_rate=44100, waveform='sine'):
-    """Generate audio data for a chord."""
-    return audio_utils.generate_chord_audio(chord, sample_rate, waveform)
+RENDER_CHUNK_SIZE = 6  # Voicings per root
+LAZY_AUDIO = os.environ.get('LAZY_AUDIO', '1') == '1'
+PREFETCH_VOICINGS = 2  # The displayed voicing and the next one in the list
+AUDIO_FORMAT = os.environ.get('AUDIO_FORMAT', 'wav')
+AUDIO_SAMPLE_RATE = int(os.environ.get('AUDIO_SAMPLE_RATE', 44100))
+
+# Precomputed voicings, memory-mapped so workers share one copy
+harmony_table = HarmonyTable.open(os.environ.get('HARMONY_TABLE_PATH') or default_path())
+
+# Chords pre-rendered by warmup() before a server takes traffic
+WARMUP_NOTES = os.environ.get('WARMUP_NOTES', 'C D E F G A B').split()
+WARMUP_CHORD_SIZES = (3, 4)
+
+# Startup timings in seconds, reported by /healthz and /metrics
+startup = {'load': time.time() - metrics.process_start_time()}
+
+# Requests slower than this many milliseconds are profiled to PROFILE_DIR
+PROFILE_SLOW_MS = float(os.environ.get('PROFILE_SLOW_MS', 0))
+PROFILE_DIR = os.environ.get('PROFILE_DIR') or os.path.join(tempfile.gettempdir(), 'harmonizer-profiles')
+profiler = metrics.SamplingProfiler() if PROFILE_SLOW_MS else None
+
+def route_label():
+    return request.url_rule.rule if request.url_rule else 'unmatched'
+
+@app.before_request
+def start_instrumentation():
+    g.request_started = time.perf_counter()
+    metrics.start_request(route_label())
+    if profiler:
+        profiler.start()
+
+@app.after_request
+def finish_instrumentation(response):
+    route = route_label()
+    method = request.method
+    started = g.request_started
+    thread_id = threading.get_ident()
+    stages = metrics.request_stages()
+    if stages:
+        response.headers['Server-Timing'] = metrics.server_timing(stages)
+    if response.content_length is not None:
+        metrics.response_bytes.observe(response.content_length, route=route)
+    
+    def finish():
+        elapsed = time.perf_counter() - started
+        metrics.request_duration.observe(elapsed, route=route, method=method, status=str(response.status_code))
+        if 'first_request' not in startup:
+            startup.setdefault('first_request', elapsed)
+            startup.setdefault('first_response', time.time() - metrics.process_start_time())
+        metrics.finish_request()
+        if profiler:
+            counts = profiler.stop(thread_id)
+            if counts and elapsed * 1000 >= PROFILE_SLOW_MS:
+                metrics.write_profile(counts, PROFILE_DIR, f'{route}-{elapsed * 1000:.0f}ms')
+    
+    # Streamed bodies (no length up front) are produced after this hook, so
+    # those requests are only timed and profiled once the response is closed
+    if response.is_streamed and response.content_length is None:
+        response.call_on_close(finish)
+    else:
+        finish()
+    return response
+
+@app.teardown_request
+def abandon_instrumentation(exc):
+    # Unhandled errors skip after_request
+    if exc is not None:
+        metrics.finish_request()
+        if profiler:
+            profiler.stop()
+
+def collect_cache_metrics():
+    caches = {'chords': chord_cache.stats(), 'bars': bar_cache.stats()}
+    families = [
+        (f'harmonizer_cache_{field}', f'Audio cache {field.replace("_", " ")}.', ('cache',),
+         [((name,), stats[field]) for name, stats in caches.items()])
+        for field in ('entries', 'bytes', 'hits', 'disk_hits', 'misses', 'evictions', 'hit_rate')
+    ]
+    sequences = sequence_renderer.stats()
+    families += [
+        (f'harmonizer_sequence_{field}', f'Sequence renderer {field.replace("_", " ")}.', (), [((), sequences[field])])
+        for field in ('entries', 'bytes', 'in_flight', 'renders', 'hits', 'coalesced', 'errors')
+    ]
+    pool = render_scheduler.stats()
+    families += [
+        (f'harmonizer_render_{field}', f'Render pool {field.replace("_", " ")}.', (), [((), pool[field])])
+        for field in ('queue_depth', 'active', 'completed', 'timeouts', 'background', 'background_errors')
+    ]
+    sessions = session_store.stats()
+    families += [
+        (f'harmonizer_session_{field}', f'Editing session {field.replace("_", " ")}.', (), [((), sessions[field])])
+        for field in ('sessions', 'created', 'edits', 'expired')
+    ]
+    families.append((
+        'harmonizer_startup_seconds',
+        'Seconds to load the app, to warm up, to answer the first request, and from process start to the first response.',
+        ('phase',),
+        [((phase,), seconds) for phase, seconds in startup.items()]
+    ))
+    return families
+
+metrics.registry.register_collector(collect_cache_metrics)
+
+def get_output_options(data):
+    """Validated (format, sample rate) for chord audio, defaulting to the server config."""
+    fmt = data.get('format', AUDIO_FORMAT)
+    sample_rate = int(data.get('sample_rate', AUDIO_SAMPLE_RATE))
+    if fmt not in audio_utils.OUTPUT_FORMATS:
+        raise ValueError(f"Invalid format: {fmt}. Must be one of {audio_utils.OUTPUT_FORMATS}")
+    if sample_rate not in audio_utils.SAMPLE_RATES:
+        raise ValueError(f"Invalid sample rate: {sample_rate}. Must be one of {audio_utils.SAMPLE_RATES}")
+    return fmt, sample_rate
+
+def generate_audio_data(chord, sample_rate=44100, waveform='sine', fmt='wav'):
+    """Generate encoded audio for a chord, served from the chord cache when possible."""
+    key = chord_key(chord, waveform, sample_rate) + (fmt,)
+    return chord_cache.get_or_render(
+        key,
+        lambda: audio_utils.generate_chord_wav(chord, sample_rate, waveform, fmt=fmt)
+    )
+
+def _missing_from_cache(chords, sample_rate, waveform, fmt):
+    """Map of cache key to chord for every chord not yet cached."""
+    missing = {}
+    for chord in chords:
+        key = chord_key(chord, waveform, sample_rate) + (fmt,)
+        if key not in missing and chord_cache.get(key) is None:
+            missing[key] = chord
+    return missing
+
+def _render_into_cache(missing, sample_rate, waveform, fmt):
+    """
+    Render a map of cache key to chord and store the results. Chords go
+    through generate_chord_wav, as in generate_audio_data, so a key always
+    holds the same bytes whichever path filled it.
+    """
+    for key, chord in missing.items():
+        chord_cache.put(key, audio_utils.generate_chord_wav(chord, sample_rate, waveform, fmt=fmt))
+
+def generate_audio_batch(chords, sample_rate=44100, waveform='sine', fmt='wav'):
+    """Make sure every chord is in the cache, rendering the misses on the render pool."""
+    missing = _missing_from_cache(chords, sample_rate, waveform, fmt)
+    
+    # Fan out one task per root's worth of voicings
+    keys = list(missing)
+    chunks = [
+        {key: missing[key] for key in keys[i:i + RENDER_CHUNK_SIZE]}
+        for i in range(0, len(keys), RENDER_CHUNK_SIZE)
+    ]
+    render_scheduler.map(lambda chunk: _render_into_cache(chunk, sample_rate, waveform, fmt), chunks)
+
+def prefetch_audio(chords, sample_rate=44100, waveform='sine', fmt='wav'):
+    """Render chords into the cache in the background."""
+    render_scheduler.submit_background(
+        lambda: _render_into_cache(_missing_from_cache(chords, sample_rate, waveform, fmt), sample_rate, waveform, fmt)
+    )
+
+def warmup():
+    """
+    Render the audio most likely to be requested first: the displayed
+    voicings of the WARMUP_NOTES chords and their sequence bars at the
+    default tempo.
+    
+    Renders run on the calling thread rather than the render pool, so a
+    server that warms up before forking its workers has no threads to lose.
+    Returns the number of chords rendered.
+    """
+    started = time.perf_counter()
+    chords = []
+    for chord_size in WARMUP_CHORD_SIZES:
+        chord_sets = Harmonizer(WARMUP_NOTES, table=harmony_table).harmonize(chord_size)
+        chords += [voicing for chord_set in chord_sets for _, voicing in chord_set[:PREFETCH_VOICINGS]]
+    missing = _missing_from_cache(chords, AUDIO_SAMPLE_RATE, 'sine', AUDIO_FORMAT)
+    _render_into_cache(missing, AUDIO_SAMPLE_RATE, 'sine', AUDIO_FORMAT)
+    for chord in chords:
+        audio_utils.render_bar(chord, 4 * 60.0 / 120, 44100, 'sine', bar_cache)
+    startup['warmup'] = time.perf_counter() - started
+    return len(missing)
+
+def reset_worker_metrics():
+    """
+    Zero the counters a worker inherits when forked from a master that
+    has warmed up, so each worker reports only its own work and summing
+    the workers does not count the warmup once per worker. The warmed
+    caches themselves are kept.
+    """
+    metrics.registry.reset()
+    chord_cache.reset_stats()
+    bar_cache.reset_stats()
+
+def chord_audio_url(chord, waveform='sine', sample_rate=44100, fmt='wav'):
+    """Content-addressed URL of a chord's audio file."""
+    midi_numbers, _, _, _ = chord_key(chord, waveform)
+    return url_for(
+        'chord_audio',
+        waveform=waveform,
+        notes='_'.join(str(n) for n in midi_numbers),
+        fmt=fmt,
+        rate=sample_rate
+    )
+
+def bar_audio_url(chord, tempo, waveform='sine', fmt='wav'):
+    """Content-addressed URL of one bar of a sequence."""
+    midi_numbers, _, _, _ = chord_key(chord, waveform)
+    return url_for(
+        'bar_audio',
+        waveform=waveform,
+        notes='_'.join(str(n) for n in midi_numbers),
+        fmt=fmt,
+        tempo=repr(float(tempo))
+    )
+
+def session_payload(session, bars):
+    """JSON state of a session, with the notes and audio URL of `bars`."""
+    def bar_data(index):
+        chord = session.chord(index)
+        return {
+            'bar': index,
+            'notes': [{'name': note.name, 'octave': note.octave} for note in chord] if chord else None,
+            'audio_url': bar_audio_url(chord, session.tempo, session.waveform) if chord else None
+        }
+    
+    return {
+        'session': session.id,
+        'version': session.version,
+        'tempo': session.tempo,
+        'waveform': session.waveform,
+        'length': len(session.bars),
+        'bars': [bar_data(index) for index in bars]
+    }
+
+def stream_sequence_response(note_sequence, tempo, waveform, download=False):
+    """
+    Stream a rendered sequence as a chunked audio/wav response.
+    
+    Streams are not single-flight: each renders its own bars (reusing any
+    in the bar cache), since their fixed gain makes them differ from the
+    normalized renders of sequence_renderer.
+    """
+    chunks = audio_utils.stream_chord_sequence(
+        note_sequence,
+        tempo=tempo,
+        waveform=waveform,
+        cache=bar_cache
+    )
+    response = Response(stream_with_context(chunks), mimetype='audio/wav')
+    if download:
+        response.headers['Content-Disposition'] = 'attachment; filename=chord_sequence.wav'
+    return response
 
 @app.route('/')
 def index():
@@ -20,39 +278,54 @@ def harmonize():
     waveform = data.get('waveform', 'sine')
     
     try:
-        # Validate input
-        notes = []
-        for note in notes_input:
-            if note.isdigit():
-                num = int(note)
-                if num < 0 or num > 11:
-                    raise ValueError(f"Note number {num} must be between 0 and 11")
-                notes.append(str(num))
-            elif note.upper() in [n.upper() for n in Note.NOTES]:
-                notes.append(note.upper())
-            else:
-                raise ValueError(f"Invalid note: {note}. Must be a number (0-11) or note name (C-B)")
+        with metrics.stage('parse'):
+            fmt, sample_rate = get_output_options(data)
+            
+            # Validate input
+            notes = []
+            for note in notes_input:
+                if note.isdigit():
+                    num = int(note)
+                    if num < 0 or num > 11:
+                        raise ValueError(f"Note number {num} must be between 0 and 11")
+                    notes.append(str(num))
+                elif note.upper() in [n.upper() for n in Note.NOTES]:
+                    notes.append(note.upper())
+                else:
+                    raise ValueError(f"Invalid note: {note}. Must be a number (0-11) or note name (C-B)")
         
-        harmonizer = Harmonizer(notes)
-        chord_sets = harmonizer.harmonize(chord_size)
+        with metrics.stage('harmonize'):
+            harmonizer = Harmonizer(notes, table=harmony_table)
+            chord_sets = harmonizer.harmonize(chord_size, optimal_cost=data.get('optimal'))
         
-        # Generate audio data for each chord voicing
-        chord_data = []
-        for chord_set in chord_sets:
-            voicings_data = []
-            for voicing_name, voicing in chord_set:
-                audio_b64 = generate_audio_data(voicing, waveform=waveform)
-                voicings_data.append({
-                    'name': voicing_name,
-                    'notes': [str(note) for note in voicing],
-                    'audio': audio_b64
-                })
-            chord_data.append(voicings_data)
+        # The browser fetches audio from the returned URLs. In lazy mode each
+        # voicing is rendered when first requested, with the likeliest ones
+        # prefetched in the background; otherwise every voicing is rendered
+        # into the cache before responding.
+        with metrics.stage('render'):
+            if data.get('lazy', LAZY_AUDIO):
+                likely = [voicing for chord_set in chord_sets for _, voicing in chord_set[:PREFETCH_VOICINGS]]
+                prefetch_audio(likely, sample_rate, waveform, fmt)
+            else:
+                voicings = [voicing for chord_set in chord_sets for _, voicing in chord_set]
+                generate_audio_batch(voicings, sample_rate, waveform, fmt)
         
-        return jsonify({
-            'success': True,
-            'chords': chord_data
-        })
+        with metrics.stage('serialize'):
+            chord_data = []
+            for chord_set in chord_sets:
+                voicings_data = []
+                for voicing_name, voicing in chord_set:
+                    voicings_data.append({
+                        'name': voicing_name,
+                        'notes': [str(note) for note in voicing],
+                        'audio_url': chord_audio_url(voicing, waveform, sample_rate, fmt)
+                    })
+                chord_data.append(voicings_data)
+            
+            return jsonify({
+                'success': True,
+                'chords': chord_data
+            })
     except Exception as e:
         return jsonify({
             'success': False,
@@ -62,103 +335,280 @@ def harmonize():
 @app.route('/shift_octave', methods=['POST'])
 def shift_octave():
     data = request.get_json()
-    voicing = [Note(note['name'], note['octave']) for note in data['notes']]
-    shift = data['shift']
-    waveform = data.get('waveform', 'sine')
+    try:
+        voicing = [Note(note['name'], note['octave']) for note in data['notes']]
+        shift = int(data['shift'])
+        waveform = oscillators.check_waveform(data.get('waveform', 'sine'))
+        fmt, sample_rate = get_output_options(data)
+    except (KeyError, TypeError, ValueError) as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
     
     # Apply the octave shift
     shifted_voicing = Voicer.shift_octave(voicing, shift)
     
-    # Generate new audio
-    audio_b64 = generate_audio_data(shifted_voicing, waveform=waveform)
-    
     return jsonify({
         'success': True,
         'notes': [{'name': note.name, 'octave': note.octave} for note in shifted_voicing],
-        'audio': audio_b64
+        'audio_url': chord_audio_url(shifted_voicing, waveform, sample_rate, fmt)
     })
 
-@app.route('/play_sequence', methods=['POST'])
-def play_sequence():
+@app.route('/voice_lead', methods=['POST'])
+def voice_lead():
     data = request.get_json()
-    sequence = data['sequence']
-    tempo = float(data['tempo'])
     waveform = data.get('waveform', 'sine')
     
     try:
-        note_sequence = []
-        for chord_data in sequence:
-            if chord_data is None:
-                note_sequence.append(None)
-            else:
-                chord_notes = [
-                    Note(note['name'], note['octave']) 
-                    for note in chord_data['notes']
-                ]
-                note_sequence.append(chord_notes)
+        fmt, sample_rate = get_output_options(data)
+        octave_range = tuple(int(o) for o in data.get('octave_range', (-1, 1)))
+        if len(octave_range) != 2 or octave_range[0] > octave_range[1]:
+            raise ValueError("octave_range must be [lowest, highest]")
         
-        audio_b64 = audio_utils.concatenate_chord_audio(
-            note_sequence, 
-            tempo=tempo, 
-            waveform=waveform
-        )
+        note_sequence = parse_note_sequence(data['sequence'])
+        voiced, movement = Harmonizer.voice_lead(note_sequence, octave_range)
+        
+        return jsonify({
+            'success': True,
+            'movement': movement,
+            'sequence': [
+                {
+                    'notes': [{'name': note.name, 'octave': note.octave} for note in chord],
+                    'audio_url': chord_audio_url(chord, waveform, sample_rate, fmt)
+                } if chord else None
+                for chord in voiced
+            ]
+        })
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        })
+
+def audio_response(key, fmt, render):
+    """
+    Cacheable audio response for the content identified by `key`.
+    
+    The ETag is derived from the key rather than the bytes, so it is the
+    same on every worker, and a conditional GET for content the client
+    already has is answered with a 304 without rendering.
+    """
+    etag = key_digest(key)
+    response = Response(mimetype=audio_utils.MIMETYPES[fmt])
+    response.set_etag(etag)
+    response.cache_control.public = True
+    response.cache_control.max_age = 86400
+    if not request.if_none_match.contains(etag):
+        with metrics.stage('render'):
+            response.set_data(render())
+    return response.make_conditional(request)
+
+@app.route('/audio/<waveform>/<notes>.<fmt>')
+def chord_audio(waveform, notes, fmt):
+    sample_rate = request.args.get('rate', AUDIO_SAMPLE_RATE, type=int)
+    if waveform not in oscillators.WAVEFORMS or fmt not in audio_utils.OUTPUT_FORMATS:
+        abort(404)
+    if sample_rate not in audio_utils.SAMPLE_RATES:
+        abort(404)
+    try:
+        midi_numbers = [int(n) for n in notes.split('_')]
+    except ValueError:
+        abort(404)
+    if len(midi_numbers) > oscillators.MAX_CHORD_SIZE or any(abs(n) > 127 for n in midi_numbers):
+        abort(404)
+    
+    chord = [Note.from_midi_number(n) for n in midi_numbers]
+    return audio_response(
+        chord_key(chord, waveform, sample_rate) + (fmt,),
+        fmt,
+        lambda: generate_audio_data(chord, sample_rate, waveform, fmt)
+    )
+
+@app.route('/bars/<waveform>/<notes>.<fmt>')
+def bar_audio(waveform, notes, fmt):
+    tempo = request.args.get('tempo', type=float)
+    if waveform not in oscillators.WAVEFORMS or fmt not in audio_utils.OUTPUT_FORMATS:
+        abort(404)
+    if tempo is None or not MIN_TEMPO <= tempo <= MAX_TEMPO:
+        abort(404)
+    try:
+        midi_numbers = [int(n) for n in notes.split('_')]
+    except ValueError:
+        abort(404)
+    if len(midi_numbers) > oscillators.MAX_CHORD_SIZE or any(abs(n) > 127 for n in midi_numbers):
+        abort(404)
+    
+    chord = [Note.from_midi_number(n) for n in midi_numbers]
+    return audio_response(
+        chord_key(chord, waveform, 44100, 4 * 60.0 / tempo) + ('bar', fmt),
+        fmt,
+        lambda: audio_utils.generate_bar_audio(chord, tempo, waveform, bar_cache, fmt)
+    )
+
+def sequence_response(download=False):
+    """Shared handler for /play_sequence and /download_sequence."""
+    action = 'download' if download else 'play'
+    try:
+        data = request.get_json()
+        with metrics.stage('parse'):
+            note_sequence = parse_note_sequence(data['sequence'])
+        tempo = float(data['tempo'])
+        waveform = data.get('waveform', 'sine')
+        # Streamed 200 headers go out before the first bar renders, so bad
+        # options must be rejected here rather than inside the stream
+        audio_utils.check_sequence_options(tempo, waveform, len(note_sequence))
+    except (KeyError, TypeError, ValueError) as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+    
+    try:
+        if data.get('stream'):
+            if not any(note_sequence):
+                return jsonify({
+                    'success': False,
+                    'error': f'No chords to {action}'
+                }), 400
+            return stream_sequence_response(note_sequence, tempo, waveform, download=download)
+        
+        # Identical concurrent or recent JSON requests share one render
+        with metrics.stage('render'):
+            audio_b64 = sequence_renderer.render(note_sequence, tempo=tempo, waveform=waveform)
         
         if audio_b64 is None:
             return jsonify({
                 'success': False,
-                'error': 'No chords to play'
+                'error': f'No chords to {action}'
+            })
+        
+        with metrics.stage('serialize'):
+            return jsonify({
+                'success': True,
+                'audio': audio_b64
             })
-            
-        return jsonify({
-            'success': True,
-            'audio': audio_b64
-        })
     except Exception as e:
         return jsonify({
             'success': False,
             'error': str(e)
         })
 
+@app.route('/play_sequence', methods=['POST'])
+def play_sequence():
+    return sequence_response()
+
 @app.route('/download_sequence', methods=['POST'])
 def download_sequence():
+    return sequence_response(download=True)
+
+@app.route('/render_timeline', methods=['POST'])
+def render_timeline():
+    """
+    Render a multi-track timeline (see timeline.Timeline.from_dict) to a
+    normalized stereo audio file, streamed one block at a time.
+    """
     data = request.get_json()
-    sequence = data['sequence']
-    tempo = float(data['tempo'])
-    waveform = data.get('waveform', 'sine')
-    
     try:
-        note_sequence = []
-        for chord_data in sequence:
-            if chord_data is None:
-                note_sequence.append(None)
-            else:
-                chord_notes = [
-                    Note(note['name'], note['octave']) 
-                    for note in chord_data['notes']
-                ]
-                note_sequence.append(chord_notes)
+        with metrics.stage('parse'):
+            fmt = data.get('format', 'wav')
+            if fmt not in audio_utils.OUTPUT_FORMATS:
+                raise ValueError(f"Invalid format: {fmt}. Must be one of {audio_utils.OUTPUT_FORMATS}")
+            timeline = Timeline.from_dict(data)
         
-        audio_b64 = audio_utils.concatenate_chord_audio(
-            note_sequence, 
-            tempo=tempo, 
-            waveform=waveform
-        )
-        
-        if audio_b64 is None:
+        if timeline.duration() <= 0:
             return jsonify({
                 'success': False,
-                'error': 'No chords to download'
+                'error': 'No events to render'
             })
-            
+        
+        # The first pass finds the peak to normalize to before any audio is
+        # sent, so errors still get a JSON response. Short repeated events
+        # are synthesized once through the bar cache
+        with metrics.stage('render'):
+            peak = timeline.peak(cache=bar_cache)
+        chunks = stream_timeline_audio(timeline, fmt=fmt, cache=bar_cache, peak=peak)
+        
+        response = Response(stream_with_context(chunks), mimetype=audio_utils.MIMETYPES[fmt])
+        if data.get('download'):
+            response.headers['Content-Disposition'] = f'attachment; filename=timeline.{fmt}'
+        return response
+    except Exception as e:
         return jsonify({
-            'success': True,
-            'audio': audio_b64
+            'success': False,
+            'error': str(e)
         })
+
+@app.route('/sessions', methods=['POST'])
+def create_session():
+    data = request.get_json()
+    try:
+        session = session_store.create(
+            parse_note_sequence(data.get('sequence', [])),
+            tempo=data.get('tempo', 120),
+            waveform=data.get('waveform', 'sine')
+        )
+        return jsonify({'success': True, **session_payload(session, range(len(session.bars)))})
     except Exception as e:
         return jsonify({
             'success': False,
             'error': str(e)
         })
 
+@app.route('/sessions/<session_id>')
+def get_session(session_id):
+    since = request.args.get('since', -1, type=int)
+    try:
+        session = session_store.get(session_id)
+    except SessionNotFound:
+        return jsonify({'success': False, 'error': 'Unknown session'}), 404
+    return jsonify({'success': True, **session_payload(session, session.changed_since(since))})
+
+@app.route('/sessions/<session_id>/edits', methods=['POST'])
+def edit_session(session_id):
+    """
+    Apply a list of edits (see sessions.Session.apply) and return only the
+    bars they changed; the client fetches just those bars' audio.
+    """
+    data = request.get_json()
+    try:
+        with metrics.stage('edit'):
+            session, changed = session_store.edit(session_id, data.get('edits', []))
+        return jsonify({'success': True, **session_payload(session, changed)})
+    except SessionNotFound:
+        return jsonify({'success': False, 'error': 'Unknown session'}), 404
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        })
+
+@app.route('/cache_stats')
+def cache_stats():
+    return jsonify({
+        'chords': chord_cache.stats(),
+        'bars': bar_cache.stats(),
+        'sequences': sequence_renderer.stats(),
+        'sessions': session_store.stats()
+    })
+
+@app.route('/render_stats')
+def render_stats():
+    return jsonify(render_scheduler.stats())
+
+@app.route('/healthz')
+def health():
+    return jsonify({
+        'status': 'ok',
+        'pid': os.getpid(),
+        'startup': startup
+    })
+
+@app.route('/metrics')
+def prometheus_metrics():
+    return Response(metrics.registry.exposition(), mimetype='text/plain; version=0.0.4')
+
 if __name__ == '__main__':
+    if os.environ.get('WARMUP', '1') == '1':
+        warmup()
     app.run(host='0.0.0.0', port=10000) 
\ No newline at end of file
@@ -0,0 +1,31 @@
+"""
+Atomic file writes for files shared between worker processes.
+
+The disk cache tier, editing sessions, the harmony table and batch renders
+are all read by other processes while they may be rewritten, so each is
+written to a temporary file in the same directory and renamed into place.
+"""
+
+import os
+import tempfile
+
+
+def atomic_write(path, write, mode='wb'):
+    """
+    Create or replace `path` with what `write(f)` writes to an open file.
+
+    Readers see either the old file or the complete new one, never a
+    partial write. If anything fails the temporary file is removed and the
+    error is raised.
+    """
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or '.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, mode) as f:
+            write(f)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
@@ -0,0 +1,215 @@
+import os
+import hashlib
+import threading
+from collections import OrderedDict
+
+from atomic_file import atomic_write
+
+
+def chord_key(chord, waveform='sine', sample_rate=44100, duration=1.0):
+    """
+    Build a normalized cache key for a rendered chord.
+
+    The mix is a plain sum of the notes, so note order does not change the
+    rendered audio; the MIDI numbers are sorted to make equivalent voicings
+    share one entry.
+    """
+    midi_numbers = tuple(sorted(note.get_midi_number() for note in chord))
+    return (midi_numbers, waveform, int(sample_rate), float(duration))
+
+
+def key_digest(key):
+    """Stable hex digest of a cache key, used for file names and URLs."""
+    return hashlib.sha1(repr(key).encode('utf-8')).hexdigest()
+
+
+class AudioCache:
+    """
+    Bounded LRU cache of rendered audio bytes with an optional on-disk tier.
+
+    The in-process tier is private to each worker and bounded by entry count
+    and, optionally, total bytes; an entry larger than `max_bytes` is not
+    kept, since it would evict everything else and still not fit. The disk
+    tier (enabled by passing `directory`) is shared by every process
+    pointing at the same directory, e.g. the gunicorn workers, and is
+    bounded by `max_disk_bytes`, evicting the least recently used files by
+    modification time.
+    """
+
+    def __init__(self, max_entries=512, directory=None, max_bytes=None, max_disk_bytes=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.directory = directory
+        self.max_disk_bytes = max_disk_bytes
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self._disk_lock = threading.Lock()
+        self._disk_written = 0
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.disk_evictions = 0
+        self.rejected = 0
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def get(self, key):
+        """Return cached bytes for `key`, or None."""
+        with self._lock:
+            data = self._entries.get(key)
+            if data is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return data
+
+        data = self._read_disk(key)
+        with self._lock:
+            if data is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+            self._store(key, data)
+        return data
+
+    def put(self, key, data):
+        """Store bytes for `key` in memory and, if enabled, on disk."""
+        with self._lock:
+            self._store(key, data)
+        self._write_disk(key, data)
+
+    def get_or_render(self, key, render):
+        """Return cached bytes for `key`, calling `render()` on a miss."""
+        data = self.get(key)
+        if data is None:
+            data = render()
+            self.put(key, data)
+        return data
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    def reset_stats(self):
+        """Zero the hit, miss and eviction counts, keeping the entries."""
+        with self._lock:
+            self.hits = 0
+            self.disk_hits = 0
+            self.misses = 0
+            self.evictions = 0
+            self.disk_evictions = 0
+            self.rejected = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'bytes': self._size,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'rejected': self.rejected,
+                'hit_rate': (self.hits + self.disk_hits) / lookups if lookups else 0.0,
+                'disk_enabled': bool(self.directory),
+                'max_disk_bytes': self.max_disk_bytes,
+                'disk_evictions': self.disk_evictions,
+            }
+
+    def _store(self, key, data):
+        # Caller must hold the lock
+        previous = self._entries.pop(key, None)
+        if previous is not None:
+            self._size -= len(previous)
+        if self.max_bytes is not None and len(data) > self.max_bytes:
+            self.rejected += 1
+            return
+        self._entries[key] = data
+        self._size += len(data)
+        while len(self._entries) > 1 and (
+            len(self._entries) > self.max_entries
+            or (self.max_bytes is not None and self._size > self.max_bytes)
+        ):
+            _, evicted = self._entries.popitem(last=False)
+            self._size -= len(evicted)
+            self.evictions += 1
+
+    def _path(self, key):
+        return os.path.join(self.directory, key_digest(key) + '.bin')
+
+    def _read_disk(self, key):
+        if not self.directory:
+            return None
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            # Reading an entry counts as using it for eviction
+            os.utime(path)
+        except OSError:
+            return None
+        return data
+
+    def _write_disk(self, key, data):
+        if not self.directory or (self.max_disk_bytes is not None and len(data) > self.max_disk_bytes):
+            return
+        try:
+            atomic_write(self._path(key), lambda f: f.write(data))
+        except OSError:
+            return
+        if self.max_disk_bytes is None:
+            return
+        # Other workers write to the same directory, so the budget is checked
+        # by listing it, once this worker has written a tenth of the budget
+        with self._disk_lock:
+            self._disk_written += len(data)
+            if self._disk_written < self.max_disk_bytes / 10:
+                return
+            self._disk_written = 0
+            self._trim_disk()
+
+    def _trim_disk(self):
+        """Delete the least recently used files until the disk tier is within budget."""
+        files = []
+        for name in os.listdir(self.directory):
+            if not name.endswith('.bin'):
+                continue
+            try:
+                stat = os.stat(os.path.join(self.directory, name))
+            except OSError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, name))
+        total = sum(size for _, size, _ in files)
+        if total <= self.max_disk_bytes:
+            return
+        # Trim below the budget so the next check does not trim again at once
+        target = self.max_disk_bytes * 0.9
+        for _, size, name in sorted(files):
+            if total <= target:
+                break
+            try:
+                os.unlink(os.path.join(self.directory, name))
+            except OSError:
+                continue
+            total -= size
+            with self._lock:
+                self.disk_evictions += 1
+
+
+chord_cache = AudioCache(
+    max_entries=int(os.environ.get('AUDIO_CACHE_SIZE', 512)),
+    directory=os.environ.get('AUDIO_CACHE_DIR') or None,
+    max_disk_bytes=int(os.environ.get('AUDIO_CACHE_DISK_MB', 512)) * 1024 * 1024,
+)
+
+# Rendered sequence bars are large and cheap to lose, so they stay in memory
+# and are bounded by size rather than count
+bar_cache = AudioCache(
+    max_entries=4096,
+    max_bytes=int(os.environ.get('BAR_CACHE_MB', 256)) * 1024 * 1024,
+)
@@ -2,151 +2,280 @@ import numpy as np
 import io
 import base64
 import struct
-from scipy import signal
-from scipy.io import wavfile
+from audio_cache import chord_key
+import oscillators
+import flac
+import metrics
+from sessions import MAX_BARS, MAX_TEMPO, MIN_TEMPO
 
-def generate_wav_file(samples, sample_rate=44100):
+OUTPUT_FORMATS = ('wav', 'flac')
+SAMPLE_RATES = (22050, 32000, 44100)
+MIMETYPES = {'wav': 'audio/wav', 'flac': 'audio/flac'}
+
+def is_stereo(waveform):
+    """Only the detuned pwm voices differ between channels."""
+    return waveform == 'pwm'
+
+def to_pcm16(samples, in_place=False, out=None):
+    """
+    Convert samples in the range -1 to 1 to 16-bit PCM.
+    
+    With `in_place`, the float samples are clipped and scaled in their own
+    buffer, leaving the int16 copy as the only allocation; with `out` as
+    well, the PCM is written there and nothing is allocated.
     """
-    Generate a WAV file from audio samples.
+    if not in_place:
+        samples = np.array(samples, dtype=np.float32)
+    np.clip(samples, -1, 1, out=samples)
+    samples *= 32767
+    if out is None:
+        return samples.astype(np.int16)
+    np.copyto(out, samples, casting='unsafe')
+    return out
+
+def encode_audio(samples, sample_rate=44100, fmt='wav'):
+    """
+    Encode audio samples as a 16-bit file.
     
     Args:
-        samples: numpy array of audio samples (-1 to 1)
+        samples: array of samples (-1 to 1), shape (samples,) for mono or
+            (samples, channels)
         sample_rate: sampling rate in Hz
+        fmt: one of OUTPUT_FORMATS
     
     Returns:
-        base64 encoded WAV file data
-    """
-    # Convert to 16-bit PCM
-    scaled = np.int16(samples * 32767)
-    
-    # Create WAV file manually
-    buffer = io.BytesIO()
-    
-    # Write WAV header
-    buffer.write(b'RIFF')
-    buffer.write(struct.pack('<I', 0))  # Placeholder for file size
-    buffer.write(b'WAVE')
-    
-    # Write format chunk
-    buffer.write(b'fmt ')
-    buffer.write(struct.pack('<I', 16))  # Chunk size
-    buffer.write(struct.pack('<H', 1))   # Audio format (PCM)
-    buffer.write(struct.pack('<H', 1))   # Number of channels
-    buffer.write(struct.pack('<I', sample_rate))  # Sample rate
-    buffer.write(struct.pack('<I', sample_rate * 2))  # Byte rate
-    buffer.write(struct.pack('<H', 2))   # Block align
-    buffer.write(struct.pack('<H', 16))  # Bits per sample
-    
-    # Write data chunk
-    buffer.write(b'data')
-    data_size = len(scaled.tobytes())
-    buffer.write(struct.pack('<I', data_size))
-    buffer.write(scaled.tobytes())
-    
-    # Go back and write file size
-    file_size = buffer.tell() - 8
-    buffer.seek(4)
-    buffer.write(struct.pack('<I', file_size))
-    
-    # Get the WAV data
-    buffer.seek(0)
-    wav_data = buffer.read()
-    buffer.close()
-    
-    return base64.b64encode(wav_data).decode('utf-8')
-
-def generate_pwm_wave(frequency, duration, sample_rate=44100, duty_cycle=0.5):
-    t = np.linspace(0, duration, int(sample_rate * duration), False)
-    # Generate slightly detuned frequencies for stereo effect
-    freq_l = frequency * 0.99  # Left channel slightly lower
-    freq_r = frequency * 1.01  # Right channel slightly higher
-    
-    # Generate PWM waves for both channels
-    left = np.where((np.sin(2 * np.pi * freq_l * t) + (1 - 2 * duty_cycle)) > 0, 1, -1)
-    right = np.where((np.sin(2 * np.pi * freq_r * t) + (1 - 2 * duty_cycle)) > 0, 1, -1)
-    
-    # Combine into stereo array
-    stereo = np.vstack((left, right)).T
-    return stereo
+        encoded file bytes
+    """
+    if fmt not in OUTPUT_FORMATS:
+        raise ValueError(f"Invalid format: {fmt}. Must be one of {OUTPUT_FORMATS}")
+    with metrics.stage('encode'):
+        pcm = to_pcm16(samples)
+        if fmt == 'flac':
+            data = flac.encode(pcm, sample_rate)
+        else:
+            # Imported here: scipy.io pulls in scipy.sparse and the MATLAB
+            # readers, a large share of the app's import time
+            from scipy.io import wavfile
+            with io.BytesIO() as wav_file:
+                wavfile.write(wav_file, sample_rate, pcm)
+                data = wav_file.getvalue()
+    metrics.encoded_bytes.observe(len(data), format=fmt)
+    return data
 
-def generate_chord_audio(chord, sample_rate=44100, waveform='sine'):
-    duration = 1.0  # seconds
-    if waveform == 'pwm':
-        # Generate stereo PWM for each note and mix
-        waves = [generate_pwm_wave(note.frequency, duration, sample_rate) for note in chord]
-        mixed = np.sum(waves, axis=0) / len(waves)
+def mix_chord(chord, out, sample_rate=44100, waveform='sine'):
+    """
+    Add the unnormalized mix of a chord to `out`, a (samples, channels)
+    float32 buffer, in place.
+    
+    Notes are averaged. With two channels, pwm voices are detuned left lower
+    and right higher; other waveforms are rendered once and copied.
+    """
+    frequencies = [note.frequency for note in chord]
+    gain = 1.0 / len(frequencies)
+    if waveform == 'pwm' and out.shape[1] == 2:
+        for channel, channel_frequencies in enumerate(oscillators.pwm_channels(frequencies)):
+            oscillators.mix(channel_frequencies, out[:, channel], sample_rate, 'pwm', gain=gain)
     else:
-        # Generate mono waves for other waveforms
-        t = np.linspace(0, duration, int(sample_rate * duration), False)
-        waves = []
-        for note in chord:
-            if waveform == 'sine':
-                wave = np.sin(2 * np.pi * note.frequency * t)
-            elif waveform == 'sawtooth':
-                wave = signal.sawtooth(2 * np.pi * note.frequency * t)
-            elif waveform == 'square':
-                wave = signal.square(2 * np.pi * note.frequency * t)
-            waves.append(wave)
-        mixed = np.sum(waves, axis=0) / len(waves)
-        # Convert to mono format
-        mixed = np.column_stack((mixed, mixed))
-    
-    # Normalize
-    mixed = mixed / np.max(np.abs(mixed))
-    
-    # Convert to WAV file
-    with io.BytesIO() as wav_file:
-        wavfile.write(wav_file, sample_rate, mixed.astype(np.float32))
-        wav_file.seek(0)
-        return base64.b64encode(wav_file.read()).decode('utf-8')
+        oscillators.mix(frequencies, out[:, 0], sample_rate, waveform, gain=gain)
+        out[:, 1:] = out[:, :1]
+    return out
 
-def concatenate_chord_audio(chord_sequence, tempo=120, waveform='sine'):
-    if not any(chord_sequence):
-        return None
+def render_chord_samples(chord, duration, sample_rate=44100, waveform='sine'):
+    """Render the unnormalized float32 mix of a chord, shape (samples, channels), mono unless pwm."""
+    channels = 2 if is_stereo(waveform) else 1
+    mixed = np.zeros((int(sample_rate * duration), channels), dtype=np.float32)
+    return mix_chord(chord, mixed, sample_rate, waveform)
+
+def normalize(samples):
+    """Scale samples in place to a peak of 1."""
+    peak = np.max(np.abs(samples))
+    if peak > 0:
+        samples *= 1 / peak
+    return samples
+
+def generate_chord_wav(chord, sample_rate=44100, waveform='sine', duration=1.0, fmt='wav'):
+    """Render a chord to normalized 16-bit WAV (or FLAC) bytes, mono unless pwm."""
+    with metrics.stage('synthesize'):
+        mixed = normalize(render_chord_samples(chord, duration, sample_rate, waveform))
+    if mixed.shape[1] == 1:
+        mixed = mixed[:, 0]
+    return encode_audio(mixed, sample_rate, fmt)
+
+def render_bar(chord, duration, sample_rate=44100, waveform='sine', cache=None):
+    """
+    Unnormalized float32 mix of one bar, shape (samples, channels).
+    
+    Bars are keyed by their content (notes, waveform, sample rate and
+    duration), so with a `cache` an edited sequence only synthesizes the
+    bars that changed.
+    """
+    channels = 2 if is_stereo(waveform) else 1
+    
+    def render():
+        return render_chord_samples(chord, duration, sample_rate, waveform)
+    
+    if cache is None:
+        return render()
+    key = chord_key(chord, waveform, sample_rate, duration) + ('pcm',)
+    data = cache.get_or_render(key, lambda: render().tobytes())
+    return np.frombuffer(data, dtype=np.float32).reshape(-1, channels)
+
+def generate_bar_audio(chord, tempo=120, waveform='sine', cache=None, fmt='wav'):
+    """
+    Encoded audio of one 4-beat bar at 44.1 kHz, mono unless pwm.
+    
+    Bars are scaled by the same fixed gain as stream_chord_sequence rather
+    than normalized, so separately fetched bars play back at matching
+    levels.
+    """
+    bar_duration = 4 * 60.0 / tempo
+    with metrics.stage('synthesize'):
+        samples = render_bar(chord, bar_duration, 44100, waveform, cache)
+    samples = samples * np.float32(1.0 / oscillators.peak_amplitude(waveform))
+    return encode_audio(samples if samples.shape[1] == 2 else samples[:, 0], 44100, fmt)
+
+def wav_header(num_frames, sample_rate=44100, channels=2):
+    """Header for a 16-bit PCM WAV file holding `num_frames` frames."""
+    data_size = num_frames * channels * 2
+    header = io.BytesIO()
+    header.write(b'RIFF')
+    header.write(struct.pack('<I', 36 + data_size))
+    header.write(b'WAVE')
+    header.write(b'fmt ')
+    header.write(struct.pack('<I', 16))  # Chunk size
+    header.write(struct.pack('<H', 1))   # Audio format (PCM)
+    header.write(struct.pack('<H', channels))
+    header.write(struct.pack('<I', sample_rate))
+    header.write(struct.pack('<I', sample_rate * channels * 2))  # Byte rate
+    header.write(struct.pack('<H', channels * 2))  # Block align
+    header.write(struct.pack('<H', 16))  # Bits per sample
+    header.write(b'data')
+    header.write(struct.pack('<I', data_size))
+    return header.getvalue()
+
+def check_sequence_options(tempo, waveform, bars):
+    """
+    Raise ValueError unless a sequence of `bars` bars can be rendered at
+    this tempo and waveform.
+    
+    Tempo and length are bounded as for editing sessions, which keeps every
+    bar to a fixed maximum size and the whole file well inside the 32-bit
+    sizes of a WAV header.
+    """
+    oscillators.check_waveform(waveform)
+    if not MIN_TEMPO <= tempo <= MAX_TEMPO:
+        raise ValueError(f"Tempo must be between {MIN_TEMPO:g} and {MAX_TEMPO:g} BPM")
+    if bars > MAX_BARS:
+        raise ValueError(f"Sequences can have at most {MAX_BARS} bars")
+
+def stream_chord_sequence(chord_sequence, tempo=120, waveform='sine', cache=None):
+    """
+    Render a chord sequence as a WAV file, one bar at a time.
     
+    Yields the WAV header followed by one 16-bit PCM chunk per bar (mono
+    unless pwm), so memory use stays at a single bar regardless of sequence
+    length.
+    Unlike concatenate_chord_audio, the output cannot be normalized to its
+    true peak; a fixed gain from the oscillator's peak bound is used instead.
+    Nothing runs until the first chunk is requested, so callers that send
+    headers first should check_sequence_options beforehand.
+    """
     sample_rate = 44100
     beat_duration = 60.0 / tempo  # Duration of one beat in seconds
     bar_duration = 4 * beat_duration  # 4 beats per bar
-    
-    # Calculate total number of samples needed
     total_samples = int(bar_duration * sample_rate * len(chord_sequence))
+    gain = np.float32(1.0 / oscillators.peak_amplitude(waveform))
+    channels = 2 if is_stereo(waveform) else 1
     
-    # Create empty stereo array
-    mixed = np.zeros((total_samples, 2))
+    yield wav_header(total_samples, sample_rate, channels)
     
+    # One bar buffer, reused for every bar
+    bar = np.empty((int(bar_duration * sample_rate) + 1, channels), dtype=np.float32)
     for i, chord in enumerate(chord_sequence):
+        start_sample = int(i * bar_duration * sample_rate)
+        end_sample = min(int((i + 1) * bar_duration * sample_rate), total_samples)
+        bar_samples = end_sample - start_sample
+        
         if chord is None:
+            yield bytes(bar_samples * channels * 2)
             continue
-            
-        start_sample = int(i * bar_duration * sample_rate)
-        end_sample = int((i + 1) * bar_duration * sample_rate)
         
-        if waveform == 'pwm':
-            # Generate stereo PWM for each note
-            waves = [generate_pwm_wave(note.frequency, bar_duration, sample_rate) for note in chord]
-            chord_audio = np.sum(waves, axis=0) / len(waves)
-        else:
-            # Generate mono audio and convert to stereo
-            t = np.linspace(0, bar_duration, int(sample_rate * bar_duration), False)
-            waves = []
-            for note in chord:
-                if waveform == 'sine':
-                    wave = np.sin(2 * np.pi * note.frequency * t)
-                elif waveform == 'sawtooth':
-                    wave = signal.sawtooth(2 * np.pi * note.frequency * t)
-                elif waveform == 'square':
-                    wave = signal.square(2 * np.pi * note.frequency * t)
-                waves.append(wave)
-            chord_audio = np.sum(waves, axis=0) / len(waves)
-            chord_audio = np.column_stack((chord_audio, chord_audio))
+        with metrics.stage('synthesize'):
+            chord_audio = render_bar(chord, bar_duration, sample_rate, waveform, cache)
         
-        mixed[start_sample:end_sample] = chord_audio
+        # Bar boundaries are rounded to whole samples, so a bar may be one
+        # sample longer or shorter than the rendered chord
+        output = bar[:bar_samples]
+        length = min(bar_samples, len(chord_audio))
+        np.multiply(chord_audio[:length], gain, out=output[:length])
+        output[length:] = 0
+        yield to_pcm16(output, in_place=True).tobytes()
+
+def render_sequence_wav(chord_sequence, tempo=120, waveform='sine', cache=None, fmt='wav'):
+    """
+    Render a chord sequence as a normalized audio file.
     
-    # Normalize
-    mixed = mixed / np.max(np.abs(mixed))
+    Bars are mixed in single precision straight into one preallocated
+    buffer (mono unless pwm), which is normalized in place and converted
+    into the PCM section of a preallocated WAV file. Peak memory is the
+    float32 mix plus the file, which is half its size.
     
-    # Convert to WAV file
-    with io.BytesIO() as wav_file:
-        wavfile.write(wav_file, sample_rate, mixed.astype(np.float32))
-        wav_file.seek(0)
-        return base64.b64encode(wav_file.read()).decode('utf-8') 
\ No newline at end of file
+    Returns:
+        WAV file bytearray (or FLAC bytes), or None if the sequence has no
+        chords
+    """
+    if not any(chord_sequence):
+        return None
+    
+    sample_rate = 44100
+    beat_duration = 60.0 / tempo  # Duration of one beat in seconds
+    bar_duration = 4 * beat_duration  # 4 beats per bar
+    
+    # Calculate total number of samples needed
+    total_samples = int(bar_duration * sample_rate * len(chord_sequence))
+    
+    # Create empty array, stereo only for pwm
+    channels = 2 if is_stereo(waveform) else 1
+    mixed = np.zeros((total_samples, channels), dtype=np.float32)
+    
+    with metrics.stage('synthesize'):
+        for i, chord in enumerate(chord_sequence):
+            if chord is None:
+                continue
+                
+            start_sample = int(i * bar_duration * sample_rate)
+            end_sample = int((i + 1) * bar_duration * sample_rate)
+            
+            # Bar boundaries are rounded to whole samples
+            length = min(end_sample, total_samples) - start_sample
+            if cache is None:
+                length = min(length, int(bar_duration * sample_rate))
+                mix_chord(chord, mixed[start_sample:start_sample + length], sample_rate, waveform)
+            else:
+                chord_audio = render_bar(chord, bar_duration, sample_rate, waveform, cache)
+                length = min(length, len(chord_audio))
+                mixed[start_sample:start_sample + length] = chord_audio[:length]
+    
+    normalize(mixed)
+    if fmt != 'wav':
+        return encode_audio(mixed if channels == 2 else mixed[:, 0], sample_rate, fmt)
+    with metrics.stage('encode'):
+        header = wav_header(total_samples, sample_rate, channels)
+        wav_data = bytearray(len(header) + total_samples * channels * 2)
+        wav_data[:len(header)] = header
+        pcm = np.frombuffer(wav_data, dtype='<i2', offset=len(header)).reshape(total_samples, channels)
+        to_pcm16(mixed, in_place=True, out=pcm)
+        del pcm
+    metrics.encoded_bytes.observe(len(wav_data), format='wav')
+    return wav_data
+
+def concatenate_chord_audio(chord_sequence, tempo=120, waveform='sine', cache=None):
+    """
+    Render a chord sequence as a normalized WAV file, base64 encoded (None
+    if it has no chords). The encoded copy adds a third to the file's size.
+    """
+    wav_data = render_sequence_wav(chord_sequence, tempo, waveform, cache)
+    if wav_data is None:
+        return None
+    with metrics.stage('base64'):
+        return base64.b64encode(wav_data).decode('utf-8')
@@ -0,0 +1,432 @@
+"""
+Benchmarks for the harmonization, voicing and synthesis hot paths.
+
+Run from the repository root:
+
+    python benchmark.py                    # full sweep
+    python benchmark.py --quick            # smaller sweep for a fast check
+    python benchmark.py --only synthesis   # one group
+    python benchmark.py --output before.json
+    python benchmark.py --output after.json --compare before.json
+
+Each case reports latency percentiles, throughput, the peak memory
+allocated while it runs (from tracemalloc, which includes NumPy buffers)
+and the process's peak resident set size during the case.
+"""
+
+import argparse
+import itertools
+import json
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+import audio_utils
+import oscillators
+from app import app, harmony_table
+from audio_cache import bar_cache, chord_cache
+from sequence_service import sequence_renderer
+from harmonizer import Harmonizer, Note, Voicer
+from timeline import Event, Timeline, Track
+
+WAVEFORMS = ['sine', 'sawtooth', 'square', 'pwm']
+CHORD_SIZES = range(2, 8)
+VOICINGS = ['close_position', 'drop_2', 'drop_top', 'raise_bottom', 'minimal_intervals', 'spread', 'optimal']
+NOTE_NAMES = Note.NOTES
+
+
+def clear_caches():
+    chord_cache.clear()
+    bar_cache.clear()
+    sequence_renderer.clear()
+
+
+def percentile(samples, q):
+    return float(np.percentile(samples, q))
+
+
+def reset_peak_rss():
+    """Reset the kernel's peak RSS counter (Linux only); False if unsupported."""
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+
+def peak_rss():
+    """Peak resident set size in bytes since the last reset (or process start)."""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return maxrss if sys.platform == 'darwin' else maxrss * 1024
+
+
+def measure(name, fn, params=None, repeat=20, setup=None):
+    """Time `fn` `repeat` times (after untimed runs that measure memory)."""
+    if setup:
+        setup()
+    rss_reset = reset_peak_rss()
+    rss_before = peak_rss()
+    fn()
+    rss_peak = peak_rss()
+    if setup:
+        setup()
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    samples = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+
+    return summarize(name, samples, params, peak, rss_peak, rss_peak - rss_before if rss_reset else None)
+
+
+def summarize(name, samples, params=None, peak=0, rss_peak=0, rss_growth=None):
+    """Result record for timed `samples` (in seconds)."""
+    mean = sum(samples) / len(samples)
+    return {
+        'name': name,
+        'params': params or {},
+        'runs': len(samples),
+        'mean_ms': mean * 1000,
+        'min_ms': min(samples) * 1000,
+        'p50_ms': percentile(samples, 50) * 1000,
+        'p90_ms': percentile(samples, 90) * 1000,
+        'p99_ms': percentile(samples, 99) * 1000,
+        'max_ms': max(samples) * 1000,
+        'ops_per_sec': 1 / mean if mean else float('inf'),
+        'peak_bytes': peak,
+        'peak_rss_bytes': rss_peak,
+        # Growth of the peak over the case; only meaningful if it was reset
+        'rss_growth_bytes': rss_growth,
+    }
+
+
+def random_chord(size, rng):
+    return [Note(rng.choice(NOTE_NAMES), rng.randint(-1, 1)) for _ in range(size)]
+
+
+def bench_harmonize(quick, repeat):
+    note_counts = [7, 12] if quick else [3, 5, 7, 9, 12]
+    for count in note_counts:
+        notes = [str(n) for n in range(count)]
+        for size in CHORD_SIZES:
+            if size > count:
+                continue
+            yield measure(
+                'harmonize',
+                lambda: Harmonizer(notes).harmonize(size),
+                {'notes': count, 'chord_size': size},
+                repeat
+            )
+            yield measure(
+                'harmonize (table)',
+                lambda: Harmonizer(notes, table=harmony_table).harmonize(size),
+                {'notes': count, 'chord_size': size},
+                repeat
+            )
+
+
+def bench_voicing(quick, repeat):
+    rng = random.Random(0)
+    for size in ([3, 7] if quick else CHORD_SIZES):
+        chords = [[Note(rng.choice(NOTE_NAMES)) for _ in range(size)] for _ in range(100)]
+        for voicing in VOICINGS:
+            method = getattr(Voicer, voicing)
+            yield measure(
+                f'voicer.{voicing}',
+                lambda: [method(chord) for chord in chords],
+                {'chord_size': size, 'chords': len(chords)},
+                repeat
+            )
+
+
+def bench_voice_leading(quick, repeat):
+    rng = random.Random(0)
+    for length in ([64] if quick else [8, 64, 512]):
+        sequence = [random_chord(rng.randint(3, 5), rng) for _ in range(length)]
+        yield measure(
+            'Harmonizer.voice_lead',
+            lambda: Harmonizer.voice_lead(sequence),
+            {'bars': length},
+            repeat
+        )
+
+
+def bench_synthesis(quick, repeat):
+    rng = random.Random(0)
+    for waveform in WAVEFORMS:
+        for size in ([3, 7] if quick else CHORD_SIZES):
+            chord = random_chord(size, rng)
+            yield measure(
+                'generate_chord_wav',
+                lambda: audio_utils.generate_chord_wav(chord, waveform=waveform),
+                {'waveform': waveform, 'chord_size': size},
+                repeat
+            )
+    for duration in ([1.0] if quick else [0.5, 1.0, 4.0]):
+        # A detuned stereo pair of pulse voices, as pwm chords use
+        yield measure(
+            'oscillate_pwm',
+            lambda: oscillators.oscillate([440.0 * ratio for ratio in oscillators.PWM_DETUNE], int(44100 * duration), 44100, 'pwm'),
+            {'duration': duration},
+            repeat
+        )
+
+
+def bench_sequence(quick, repeat):
+    rng = random.Random(0)
+    tempos = [120] if quick else [40, 120, 200]
+    lengths = [8] if quick else [8, 64]
+    for waveform in WAVEFORMS:
+        for tempo in tempos:
+            for length in lengths:
+                sequence = [random_chord(4, rng) if i % 5 != 4 else None for i in range(length)]
+                yield measure(
+                    'concatenate_chord_audio',
+                    lambda: audio_utils.concatenate_chord_audio(sequence, tempo=tempo, waveform=waveform),
+                    {'waveform': waveform, 'tempo': tempo, 'bars': length},
+                    max(1, repeat // 4)
+                )
+
+
+def looped_timeline(tracks, beats, rng):
+    """Tracks that each repeat a random two-bar pattern, as in a loop-based song."""
+    timeline_tracks = []
+    for index in range(tracks):
+        pattern = []
+        beat = 0.0
+        while beat < 8:
+            length = rng.choice([0.5, 1.0, 2.0])
+            pattern.append((random_chord(rng.randint(1, 4), rng), beat, length))
+            beat += length
+        events = [
+            Event(notes, loop * 8 + start, length, 0.8)
+            for loop in range(int(beats // 8))
+            for notes, start, length in pattern
+        ]
+        timeline_tracks.append(Track(
+            events, waveform=WAVEFORMS[index % len(WAVEFORMS)], volume=0.5, pan=rng.uniform(-1, 1)
+        ))
+    return Timeline(timeline_tracks, tempo=120, length=beats)
+
+
+def bench_timeline(quick, repeat):
+    rng = random.Random(0)
+    track_counts = [8] if quick else [8, 32]
+    for tracks in track_counts:
+        timeline = looped_timeline(tracks, 60, rng)  # 30 seconds
+        for cached in (False, True):
+            yield measure(
+                'Timeline.render_blocks',
+                lambda: sum(len(block) for _, block in timeline.render_blocks(cache=bar_cache if cached else None)),
+                {'tracks': tracks, 'seconds': timeline.duration(), 'cached': cached},
+                max(1, repeat // 5),
+                setup=clear_caches if not cached else None
+            )
+
+
+def bench_routes(quick, repeat):
+    client = app.test_client()
+    sequence = [
+        {'notes': [{'name': name, 'octave': 0} for name in chord]} if chord else None
+        for chord in [['C', 'E', 'G'], ['D', 'F', 'A'], None, ['G', 'B', 'D', 'F']] * 2
+    ]
+    sequence_payload = {'sequence': sequence, 'tempo': 120, 'waveform': 'sine'}
+
+    def get(url, **kwargs):
+        response = client.get(url, **kwargs)
+        assert response.status_code in (200, 304), (url, response.status_code)
+        return response.data
+
+    def post(url, payload):
+        response = client.post(url, json=payload)
+        assert response.status_code == 200, (url, response.status_code)
+        return response.data
+
+    note_inputs = ['C E G', 'C D E F G A B'] if quick else ['C E G', 'C D E F G A B', ' '.join(map(str, range(12)))]
+    for notes in note_inputs:
+        for lazy in (True, False):
+            yield measure(
+                'POST /harmonize',
+                lambda: post('/harmonize', {'notes': notes, 'chord_size': 3, 'lazy': lazy}),
+                {'notes': len(notes.split()), 'lazy': lazy},
+                repeat,
+                setup=clear_caches
+            )
+
+    shift_payload = {'notes': sequence[0]['notes'], 'shift': 1}
+    yield measure('POST /shift_octave', lambda: post('/shift_octave', shift_payload), {}, repeat)
+    yield measure('GET /audio (cold)', lambda: get('/audio/sine/0_4_7.wav'), {}, repeat, setup=clear_caches)
+    yield measure('GET /audio (cached)', lambda: get('/audio/sine/0_4_7.wav'), {}, repeat)
+    for route in ('/play_sequence', '/download_sequence'):
+        yield measure(f'POST {route}', lambda: post(route, sequence_payload), {}, repeat, setup=clear_caches)
+    yield measure(
+        'POST /play_sequence (stream)',
+        lambda: post('/play_sequence', dict(sequence_payload, stream=True)),
+        {},
+        repeat,
+        setup=clear_caches
+    )
+
+    # One grid edit through a session: the diff, then the changed bar's audio
+    session = json.loads(post('/sessions', sequence_payload))['session']
+    shifts = itertools.cycle((1, -1))
+
+    def edit_bar():
+        edited = json.loads(post(f'/sessions/{session}/edits', {'edits': [{'bar': 0, 'shift': next(shifts)}]}))
+        return [get(bar['audio_url']) for bar in edited['bars']]
+
+    yield measure('session edit + bar', edit_bar, {}, repeat, setup=clear_caches)
+
+
+# Runs in a fresh interpreter, so imports and first requests are cold
+STARTUP_PROBE = '''
+import json, sys, time
+import metrics
+import app
+
+if sys.argv[1] == '1':
+    app.warmup()
+client = app.app.test_client()
+
+def timed(fn):
+    start = time.perf_counter()
+    response = fn()
+    assert response.status_code == 200, response.status_code
+    return response, time.perf_counter() - start
+
+timed(lambda: client.get('/healthz'))
+healthy = time.time() - metrics.process_start_time()
+harmonized, harmonize = timed(lambda: client.post('/harmonize', json={'notes': 'C D E F G A B', 'chord_size': 3}))
+_, audio = timed(lambda: client.get(harmonized.get_json()['chords'][0][0]['audio_url']))
+with open('/proc/self/status') as f:
+    rss = next((int(line.split()[1]) * 1024 for line in f if line.startswith('VmHWM:')), 0)
+print(json.dumps({'healthy': healthy, 'harmonize': harmonize, 'audio': audio, 'rss': rss}))
+'''
+
+
+def bench_startup(quick, repeat):
+    """
+    Time to the first healthy response, measured from process start, and
+    the latency of the first requests a new process serves, with and
+    without warmup.
+    """
+    env = dict(os.environ)
+    # No shared disk tiers, so every run starts cold
+    env.pop('AUDIO_CACHE_DIR', None)
+    env.pop('SESSION_DIR', None)
+    runs = max(3, repeat // 4)
+    for warm in (False, True):
+        probes = []
+        for _ in range(runs):
+            output = subprocess.run(
+                [sys.executable, '-c', STARTUP_PROBE, '1' if warm else '0'],
+                capture_output=True, text=True, check=True, env=env
+            ).stdout
+            probes.append(json.loads(output.splitlines()[-1]))
+        rss = max(probe['rss'] for probe in probes)
+        for name, field in (
+            ('startup: time to healthy', 'healthy'),
+            ('startup: first /harmonize', 'harmonize'),
+            ('startup: first /audio', 'audio'),
+        ):
+            yield summarize(name, [probe[field] for probe in probes], {'warmup': warm}, rss_peak=rss)
+
+
+GROUPS = {
+    'harmonize': bench_harmonize,
+    'voicing': bench_voicing,
+    'voice_leading': bench_voice_leading,
+    'synthesis': bench_synthesis,
+    'sequence': bench_sequence,
+    'timeline': bench_timeline,
+    'routes': bench_routes,
+    'startup': bench_startup,
+}
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def case_id(result):
+    return result['name'] + ' ' + json.dumps(result['params'], sort_keys=True)
+
+
+def print_result(result, baseline=None):
+    line = (f"{result['name']:<32} {json.dumps(result['params'], sort_keys=True):<48} "
+            f"p50 {result['p50_ms']:9.3f} ms  p99 {result['p99_ms']:9.3f} ms  "
+            f"{result['ops_per_sec']:10.1f} ops/s  peak {result['peak_bytes'] / 1e6:8.2f} MB  "
+            f"rss {result['peak_rss_bytes'] / 1e6:8.1f} MB")
+    if baseline:
+        line += f"  ({baseline['p50_ms'] / result['p50_ms']:.2f}x vs baseline)"
+    print(line)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--quick', action='store_true', help='run a reduced sweep')
+    parser.add_argument('--repeat', type=int, default=None, help='timed runs per case')
+    parser.add_argument('--only', choices=sorted(GROUPS), action='append', help='benchmark group(s) to run')
+    parser.add_argument('--output', help='write results as JSON to this file')
+    parser.add_argument('--compare', help='JSON results from an earlier run to compare against')
+    args = parser.parse_args(argv)
+
+    repeat = args.repeat or (5 if args.quick else 20)
+    baseline = {}
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = {case_id(result): result for result in json.load(f)['results']}
+
+    results = []
+    for group in args.only or GROUPS:
+        for result in GROUPS[group](args.quick, repeat):
+            result['group'] = group
+            print_result(result, baseline.get(case_id(result)))
+            results.append(result)
+
+    if args.output:
+        report = {
+            'revision': git_revision(),
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'python': sys.version.split()[0],
+            'numpy': np.__version__,
+            'platform': platform.platform(),
+            'quick': args.quick,
+            'repeat': repeat,
+            'results': results,
+        }
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
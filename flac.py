@@ -0,0 +1,259 @@
+"""
+Minimal FLAC encoder written in NumPy.
+
+Encodes 16-bit PCM using the fixed linear predictors (orders 0-4) with a
+single Rice partition per subframe, which gets most of FLAC's gain on
+synthesized material without needing LPC analysis or an external codec.
+"""
+
+import struct
+import numpy as np
+
+BLOCK_SIZE = 4096
+BITS_PER_SAMPLE = 16
+MAX_FIXED_ORDER = 4
+MAX_RICE_PARAMETER = 14
+
+
+class _Crc:
+    """
+    Non-reflected CRC with a zero initial value, as FLAC uses, in NumPy.
+
+    Such a CRC is linear in the message bits. Messages are split into rows
+    of ROW bytes: each row's CRC is an XOR of per-position byte tables, and
+    each row CRC is then shifted past the rows that follow it.
+    """
+
+    ROW = 256
+
+    def __init__(self, poly, width):
+        self.poly = poly
+        self.width = width
+        self.top = 1 << (width - 1)
+        self.mask = (1 << width) - 1
+        # x^k mod P for the bit positions of one row plus the CRC width
+        powers = [1]
+        for _ in range(8 * self.ROW + width):
+            powers.append(self._times_x(powers[-1]))
+        powers = np.array(powers, dtype=np.uint32)
+        # A byte at position p of a row is followed by ROW - 1 - p bytes
+        positions = 8 * (self.ROW - 1 - np.arange(self.ROW))[:, None] + width + np.arange(8)
+        bits = (np.arange(256)[:, None] >> np.arange(8)) & 1
+        self.table = np.bitwise_xor.reduce(
+            np.where(bits[None].astype(bool), powers[positions][:, None, :], 0), axis=2
+        ).astype(np.uint32)
+        # shifts[d][i]: x^(i + 8 * ROW * d) mod P, grown as longer messages arrive
+        self.shifts = [[1 << i for i in range(width)], list(powers[8 * self.ROW:8 * self.ROW + width])]
+        self._shift_array = np.array(self.shifts, dtype=np.uint32)
+
+    def _times_x(self, value):
+        return ((value << 1) ^ self.poly) & self.mask if value & self.top else value << 1
+
+    def _shift(self, value, shift):
+        """value * x^(8 * ROW * d) mod P, given that shift's basis."""
+        result = 0
+        for i in range(self.width):
+            if value >> i & 1:
+                result ^= shift[i]
+        return result
+
+    def __call__(self, data):
+        data = np.frombuffer(bytes(data), dtype=np.uint8)
+        # Leading zero bytes do not change a zero-initialized CRC
+        rows = np.concatenate((np.zeros(-len(data) % self.ROW, dtype=np.uint8), data)).reshape(-1, self.ROW)
+        row_crcs = np.bitwise_xor.reduce(self.table[np.arange(self.ROW), rows], axis=1)
+        while len(self.shifts) < len(rows):
+            self.shifts.append([self._shift(value, self.shifts[1]) for value in self.shifts[-1]])
+            self._shift_array = np.array(self.shifts, dtype=np.uint32)
+        shifts = self._shift_array[len(rows) - 1 - np.arange(len(rows))]
+        bits = ((row_crcs[:, None] >> np.arange(self.width, dtype=np.uint32)) & 1).astype(bool)
+        return int(np.bitwise_xor.reduce(shifts[bits])) if bits.any() else 0
+
+
+_crc8 = _Crc(0x07, 8)
+_crc16 = _Crc(0x8005, 16)
+
+
+def _utf8_number(n):
+    """FLAC's extended UTF-8 coding of a frame number."""
+    if n < 0x80:
+        return bytes([n])
+    tail = []
+    while True:
+        tail.insert(0, 0x80 | (n & 0x3F))
+        n >>= 6
+        # The lead byte holds (7 - length) payload bits after its length prefix
+        if n < (1 << (6 - len(tail))):
+            lead = (0xFF00 >> (len(tail) + 1)) & 0xFF
+            return bytes([lead | n] + tail)
+
+
+class _BitWriter:
+    """Collects (value, width) fields and packs them MSB-first in one pass."""
+
+    def __init__(self):
+        self.values = []
+        self.widths = []
+
+    def write(self, value, width):
+        self.values.append(np.asarray(value, dtype=np.uint64).reshape(-1))
+        self.widths.append(np.broadcast_to(np.asarray(width, dtype=np.int64), self.values[-1].shape))
+
+    def tobytes(self):
+        values = np.concatenate(self.values)
+        widths = np.concatenate(self.widths)
+        # Fields are placed by their last bit into big-endian 64-bit words.
+        # Values are at most 16 bits, so a field spills into at most the
+        # word before; wider fields are unary codes, zeros before the value
+        last = np.cumsum(widths) - 1
+        word = last >> 6
+        offset = (63 - (last & 63)).astype(np.uint64)
+        words = np.zeros(int(word[-1]) + 1, dtype=np.uint64)
+        starts = np.flatnonzero(np.diff(word, prepend=-1))
+        words[word[starts]] |= np.bitwise_or.reduceat(values << offset, starts)
+        spill = (values >> np.uint64(1)) >> (np.uint64(63) - offset)
+        spilled = np.flatnonzero(spill)
+        if len(spilled):
+            words[word[spilled] - 1] |= spill[spilled]
+        return words.astype('>u8').tobytes()[:(int(last[-1]) + 8) // 8]
+
+
+def _rice_cost(folded, k):
+    """Exact bits to Rice-code `folded` with parameter k."""
+    return int((folded >> np.uint64(k)).sum()) + len(folded) * (k + 1)
+
+
+def _rice_parameter(folded):
+    """
+    The cheapest Rice parameter and its cost.
+
+    The cost is convex in k, so the search walks downhill from the
+    parameter matching the mean instead of trying every k; ties go to the
+    smaller k.
+    """
+    k = min(max(int(folded.mean()).bit_length() - 1, 0), MAX_RICE_PARAMETER)
+    cost = _rice_cost(folded, k)
+    while k > 0:
+        lower = _rice_cost(folded, k - 1)
+        if lower > cost:
+            break
+        k, cost = k - 1, lower
+    else:
+        return k, cost
+    while k < MAX_RICE_PARAMETER:
+        higher = _rice_cost(folded, k + 1)
+        if higher >= cost:
+            break
+        k, cost = k + 1, higher
+    return k, cost
+
+
+def _write_subframe(writer, samples):
+    """Write a CONSTANT, FIXED or VERBATIM subframe, whichever is smallest."""
+    samples = samples.astype(np.int64)
+    if np.all(samples == samples[0]):
+        writer.write(0b00000000, 8)
+        writer.write(samples[0] & 0xFFFF, BITS_PER_SAMPLE)
+        return
+
+    best = None
+    for order in range(min(MAX_FIXED_ORDER, len(samples) - 1) + 1):
+        residual = np.diff(samples, n=order)
+        folded = np.where(residual >= 0, residual * 2, -residual * 2 - 1).astype(np.uint64)
+        k, cost = _rice_parameter(folded)
+        bits = cost + order * BITS_PER_SAMPLE + 10
+        if best is None or bits < best[0]:
+            best = (bits, order, k, folded)
+
+    bits, order, k, folded = best
+    if bits >= len(samples) * BITS_PER_SAMPLE:
+        writer.write(0b00000010, 8)
+        writer.write(samples & 0xFFFF, BITS_PER_SAMPLE)
+        return
+
+    writer.write(0b00010000 | (order << 1), 8)
+    writer.write(samples[:order] & 0xFFFF, BITS_PER_SAMPLE)
+    writer.write(0, 2)  # Rice coding with 4-bit parameters
+    writer.write(0, 4)  # Partition order 0
+    writer.write(k, 4)
+    # Each residual is its quotient in unary (zeros then a one) followed by
+    # the k low bits, so the two fields are interleaved per residual
+    quotients = (folded >> np.uint64(k)).astype(np.int64)
+    values = np.column_stack((np.ones_like(folded), folded & np.uint64((1 << k) - 1)))
+    widths = np.column_stack((quotients + 1, np.full_like(quotients, k)))
+    writer.write(values.ravel(), widths.ravel())
+
+
+def _frame(block, frame_number):
+    header = bytearray()
+    header += struct.pack('>H', 0xFFF8)  # Sync code, fixed block size
+    channels = block.shape[1]
+    # Block size stored as 16 bits at the end of the header, sample rate
+    # taken from STREAMINFO, independent channels, 16 bits per sample
+    header.append(0b01110000)
+    header.append(((channels - 1) << 4) | 0b1000)
+    header += _utf8_number(frame_number)
+    header += struct.pack('>H', len(block) - 1)
+    header.append(_crc8(header))
+
+    writer = _BitWriter()
+    for channel in range(channels):
+        _write_subframe(writer, block[:, channel])
+    frame = bytes(header) + writer.tobytes()
+    return frame + struct.pack('>H', _crc16(frame))
+
+
+def _streaminfo(block_size, min_frame_size, max_frame_size, sample_rate, channels, total):
+    streaminfo = struct.pack('>HH', block_size, block_size)
+    streaminfo += struct.pack('>I', min_frame_size)[1:]
+    streaminfo += struct.pack('>I', max_frame_size)[1:]
+    streaminfo += struct.pack(
+        '>Q',
+        (sample_rate << 44) | ((channels - 1) << 41) | ((BITS_PER_SAMPLE - 1) << 36) | total
+    )
+    streaminfo += bytes(16)  # MD5 signature left unset
+
+    # Last-metadata-block flag set, block type 0 (STREAMINFO)
+    metadata = struct.pack('>I', (1 << 31) | len(streaminfo)) + streaminfo
+    return b'fLaC' + metadata
+
+
+def encode(samples, sample_rate):
+    """
+    Encode int16 samples as a FLAC file.
+
+    Args:
+        samples: int16 array of shape (samples,) or (samples, channels)
+        sample_rate: sampling rate in Hz
+
+    Returns:
+        FLAC file bytes
+    """
+    samples = np.asarray(samples, dtype=np.int16)
+    if samples.ndim == 1:
+        samples = samples[:, None]
+    total, channels = samples.shape
+    block_size = max(16, min(BLOCK_SIZE, total))
+
+    frames = [
+        _frame(samples[start:start + block_size], number)
+        for number, start in enumerate(range(0, total, block_size))
+    ]
+    frame_sizes = [len(frame) for frame in frames] or [0]
+    header = _streaminfo(block_size, min(frame_sizes), max(frame_sizes), sample_rate, channels, total)
+    return header + b''.join(frames)
+
+
+def stream_header(sample_rate, channels, total):
+    """
+    Header of a FLAC file written one frame at a time with encode_frame.
+
+    Frames hold BLOCK_SIZE samples each, except the last. Frame sizes are
+    not known up front, so they are marked unknown.
+    """
+    return _streaminfo(max(16, min(BLOCK_SIZE, total)), 0, 0, sample_rate, channels, total)
+
+
+def encode_frame(block, number):
+    """Encode frame `number`: int16 samples of shape (samples, channels)."""
+    return _frame(np.asarray(block, dtype=np.int16), number)
@@ -1,2 +1,67 @@
+import os
+import tempfile
+
+from harmony_table import HarmonyTable, default_path
+
 bind = "0.0.0.0:10000"
-workers = 2 
\ No newline at end of file
+
+# One worker process per core by default. Threaded workers overlap requests
+# (and hold open session event streams) without an async library; renders
+# themselves run on each worker's pool in render_pool.py
+cpu_count = os.cpu_count() or 1
+workers = int(os.environ.get("WEB_CONCURRENCY", 0)) or max(2, cpu_count)
+worker_class = os.environ.get("GUNICORN_WORKER_CLASS", "gthread")
+threads = int(os.environ.get("GUNICORN_THREADS", 4))
+
+# Split the cores between the workers' render pools instead of giving every
+# worker a pool the size of the machine
+os.environ.setdefault("RENDER_WORKERS", str(max(2, cpu_count // workers)))
+
+# Import the app once in the master and fork the workers from it, so they
+# share its read-only state (code, wavetables, the mapped voicing table and
+# the warmed caches) copy-on-write
+preload_app = os.environ.get("GUNICORN_PRELOAD", "1") == "1"
+warmup = os.environ.get("WARMUP", "1") == "1"
+
+# Share rendered chord audio between workers through an on-disk cache tier
+os.environ.setdefault("AUDIO_CACHE_DIR", os.path.join(tempfile.gettempdir(), "harmonizer-audio-cache"))
+
+# Keep grid editing sessions where every worker can read them
+os.environ.setdefault("SESSION_DIR", os.path.join(tempfile.gettempdir(), "harmonizer-sessions"))
+
+# Build the precomputed voicing table once, before the workers fork and map it
+os.environ.setdefault("HARMONY_TABLE_PATH", default_path())
+
+
+def on_starting(server):
+    HarmonyTable.open(os.environ["HARMONY_TABLE_PATH"])
+
+
+def when_ready(server):
+    # Preloaded: warm up once in the master, before any worker is forked
+    if preload_app and warmup:
+        _warmup(server)
+
+
+def post_fork(server, worker):
+    # Workers forked from a warmed-up master would each report its warmup
+    if preload_app:
+        import app
+
+        app.reset_worker_metrics()
+
+
+def post_worker_init(worker):
+    # Not preloaded: each worker warms up before it accepts connections
+    if not preload_app and warmup:
+        _warmup(worker)
+
+
+def _warmup(target):
+    import app
+
+    rendered = app.warmup()
+    target.log.info(
+        "Warmed up %d chords in %.2fs (app loaded %.2fs after process start)",
+        rendered, app.startup["warmup"], app.startup["load"]
+    )
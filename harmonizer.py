@@ -1,8 +1,24 @@
+import numpy as np
+from functools import lru_cache
+
+
 class Note:
-    """Represents a musical note."""
+    """
+    Represents a musical note.
+    
+    Notes are immutable and interned: every pitch in the MIDI range maps to
+    one shared instance with its MIDI number and frequency precomputed, so
+    comparing, hashing and octave moves are integer operations.
+    """
     NOTES = ['C', 'C#', 'D', 'D#', 'E', 'F', 'F#', 'G', 'G#', 'A', 'A#', 'B']
+    
+    __slots__ = ('name', 'number', 'octave', 'midi_number', 'frequency')
+    
+    # get_midi_number() counts from C4 (octave 0) = 0, i.e. true MIDI - 60
+    MIDI_OFFSET = 60
+    _interned = {}
 
-    def __init__(self, name, octave=4):
+    def __new__(cls, name, octave=4):
         if isinstance(name, (int, str)):
             # Convert string numbers to integers
             if isinstance(name, str) and name.isdigit():
@@ -10,35 +26,60 @@ class Note:
             
             if isinstance(name, int):
                 # If given a number (0-11)
-                self.number = int(name) % 12
-                self.name = self.NOTES[self.number]
+                number = int(name) % 12
             else:
                 # If given a note name
-                self.name = name.upper()
-                if self.name not in self.NOTES:
-                    raise ValueError(f"Invalid note name: {name}. Must be one of {self.NOTES}")
-                self.number = self.NOTES.index(self.name)
+                upper = name.upper()
+                if upper not in cls.NOTES:
+                    raise ValueError(f"Invalid note name: {name}. Must be one of {cls.NOTES}")
+                number = cls.NOTES.index(upper)
         else:
             raise ValueError("Input must be a note name (str) or a number (0-11)")
             
-        self.octave = octave
+        return cls.from_midi_number(number + int(octave) * 12)
 
-    @property
-    def frequency(self):
-        """Calculate frequency in Hz using A4 = 440Hz as reference"""
+    @classmethod
+    def from_midi_number(cls, midi_number):
+        """Return the note for a number as returned by get_midi_number()."""
+        note = cls._interned.get(midi_number)
+        if note is not None:
+            return note
+        
+        note = object.__new__(cls)
         A4 = 440  # Hz
         A4_note_number = 69  # MIDI note number for A4
+        for attr, value in (
+            ('name', cls.NOTES[midi_number % 12]),
+            ('number', midi_number % 12),
+            ('octave', midi_number // 12),
+            ('midi_number', midi_number),
+            # f = 440 * 2^((n-69)/12)
+            ('frequency', A4 * (2 ** ((midi_number + cls.MIDI_OFFSET - A4_note_number) / 12))),
+        ):
+            object.__setattr__(note, attr, value)
         
-        # Calculate MIDI note number
-        midi_note = self.number + (self.octave * 12) + 60
-        
-        # Convert MIDI note to frequency
-        # f = 440 * 2^((n-69)/12)
-        return A4 * (2 ** ((midi_note - A4_note_number) / 12))
+        # Only the MIDI range is interned so arbitrary octave shifts cannot
+        # grow the table without bound
+        if -cls.MIDI_OFFSET <= midi_number < 128 - cls.MIDI_OFFSET:
+            note = cls._interned.setdefault(midi_number, note)
+        return note
 
     def get_midi_number(self):
         """Get the MIDI note number including octave information."""
-        return self.number + (self.octave * 12)
+        return self.midi_number
+
+    def transpose(self, octaves):
+        """The same note moved by a number of octaves."""
+        return Note.from_midi_number(self.midi_number + octaves * 12)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Note is immutable")
+
+    def __delattr__(self, name):
+        raise AttributeError("Note is immutable")
+
+    def __reduce__(self):
+        return (Note.from_midi_number, (self.midi_number,))
 
     def __str__(self):
         return f"{self.name}{self.octave}"
@@ -49,79 +90,113 @@ class Note:
     def __eq__(self, other):
         if not isinstance(other, Note):
             return False
-        return (self.name == other.name and 
-                self.number == other.number and 
-                self.octave == other.octave)
+        return self.midi_number == other.midi_number
+
+    def __hash__(self):
+        return hash(self.midi_number)
+
+
+# Flyweight table of the 128 MIDI notes
+for _midi_number in range(-Note.MIDI_OFFSET, 128 - Note.MIDI_OFFSET):
+    Note.from_midi_number(_midi_number)
+del _midi_number
 
 
 class Harmonizer:
     """Harmonizes a sequence of notes into chords."""
-    def __init__(self, notes):
+    def __init__(self, notes, table=None):
+        """
+        Args:
+            notes: note names or numbers
+            table: optional HarmonyTable of precomputed voicings to look
+                chords up in instead of voicing them
+        """
         if not notes:
             raise ValueError("Notes list cannot be empty")
         self.notes = [Note(note) for note in notes]
         self.voicer = Voicer()
+        self.table = table
 
-    def harmonize(self, chord_size=3):
-        """Harmonize with multiple voicing options per chord."""
+    def harmonize(self, chord_size=3, optimal_cost=None):
+        """
+        Harmonize with multiple voicing options per chord.
+        
+        With `optimal_cost` set (see Voicer.optimal), each chord set also
+        gets the best voicing under that cost.
+        """
         if chord_size < 2:
             raise ValueError("Chord size must be at least 2")
         if chord_size > len(self.notes):
             raise ValueError(f"Chord size ({chord_size}) cannot be larger than number of notes ({len(self.notes)})")
             
+        pitch_classes = [note.number for note in self.notes]
+        voiced = self.table.lookup(pitch_classes, chord_size) if self.table is not None else None
+        if voiced is None:
+            # Voice every root's chord in one batch of MIDI-number arrays
+            voiced = np.stack([voicing for _, voicing in ArrayVoicer.voice_all(self._build_chords(chord_size))], axis=1)
+        voiced = voiced.tolist()
+        if optimal_cost:
+            chords = self._build_chords(chord_size)
+        
         chord_sets = []
-        for root in self.notes:
-            # Get basic chord
-            basic_chord = self._build_chord(root, chord_size)
-            
-            # Generate all voicing variations
-            voicings = self._generate_voicings(basic_chord)
-            chord_sets.append(voicings)
+        for i in range(len(self.notes)):
+            chord_sets.append([
+                (name, [Note.from_midi_number(n) for n in voicing])
+                for name, voicing in zip(ArrayVoicer.NAMES, voiced[i])
+            ])
+            if optimal_cost:
+                chord_notes = [Note.from_midi_number(n) for n in chords[i].tolist()]
+                chord_sets[-1].append(
+                    (f"Optimal ({optimal_cost})", Voicer.optimal(chord_notes, optimal_cost))
+                )
             
         return chord_sets
     
-    def _build_chord(self, root, size):
-        """Build a basic chord of given size (all notes in same octave)."""
-        if not self.notes or size < 1:
-            return []
-            
-        chord = []
-        try:
-            index = self.notes.index(root)
-            while len(chord) < size:
-                chord.append(self.notes[index % len(self.notes)])
-                index += 2  # Skip one note
-        except ValueError as e:
-            raise ValueError(f"Root note {root} not found in notes list") from e
-        except Exception as e:
-            raise ValueError(f"Error building chord: {str(e)}") from e
-            
-        return chord
-    
-    def _generate_voicings(self, chord_notes):
-        """Generate different voicings for a chord."""
-        voicings = []
-        
-        # Basic voicings
-        close = Voicer.close_position(chord_notes)
-        voicings.append(("Close Position", close))
-        
-        drop2 = Voicer.drop_2(chord_notes)
-        voicings.append(("Drop 2", drop2))
+    @staticmethod
+    def voice_lead(chord_sequence, octave_range=(-1, 1)):
+        """
+        Choose a voicing for every chord to minimize total voice movement.
         
-        drop_top = Voicer.drop_top(chord_notes)
-        voicings.append(("Drop Top", drop_top))
+        Candidates for each chord are its given voicing and the preset
+        voicings of its notes, each shifted by every octave in
+        `octave_range`. A Viterbi pass over the sequence finds the cheapest
+        path, so the cost is linear in the number of chords. None entries
+        (rests) are kept, and movement is measured across them.
         
-        raise_bottom = Voicer.raise_bottom(chord_notes)
-        voicings.append(("Raise Bottom", raise_bottom))
+        Returns:
+            (voiced sequence, total movement in semitones)
+        """
+        bars = [i for i, chord in enumerate(chord_sequence) if chord]
+        result = [None] * len(chord_sequence)
+        if not bars:
+            return result, 0
         
-        minimal = Voicer.minimal_intervals(chord_notes)
-        voicings.append(("Minimal Intervals", minimal))
+        candidates = _voice_leading_candidates([chord_sequence[i] for i in bars], octave_range)
         
-        spread = Voicer.spread(chord_notes)
-        voicings.append(("Spread", spread))
+        # score[k] is the cheapest movement up to this chord ending in its
+        # k-th candidate; back[t][k] is the candidate chosen for chord t - 1
+        score = np.zeros(len(candidates[0]), dtype=np.int64)
+        back = []
+        for previous, current in zip(candidates, candidates[1:]):
+            total = score[:, None] + _movement(previous, current)
+            back.append(total.argmin(axis=0))
+            score = total.min(axis=0)
         
-        return voicings
+        choice = int(score.argmin())
+        movement = int(score[choice])
+        for t in range(len(bars) - 1, -1, -1):
+            result[bars[t]] = [Note.from_midi_number(n) for n in candidates[t][choice].tolist()]
+            if t:
+                choice = int(back[t - 1][choice])
+        return result, movement
+    
+    def _build_chords(self, size):
+        """Pitch classes of the basic chord on every root, as a (roots x size) array."""
+        numbers = np.array([note.number for note in self.notes])
+        # A repeated root starts from its first occurrence in the notes
+        first_index = np.array([self.notes.index(note) for note in self.notes])
+        indices = (first_index[:, None] + 2 * np.arange(size)) % len(self.notes)
+        return numbers[indices]
 
 
 class Voicer:
@@ -134,7 +209,7 @@ class Voicer:
             return []
             
         root = chord_notes[0]
-        voiced_notes = [Note(root.name, 0)]  # Root in base octave
+        voiced_notes = [Note(root.number, 0)]  # Root in base octave
         
         current_note = voiced_notes[0]
         for note in chord_notes[1:]:
@@ -142,7 +217,7 @@ class Voicer:
             if note.number < current_note.number:
                 new_octave += 1
             
-            new_note = Note(note.name, new_octave)
+            new_note = Note(note.number, new_octave)
             current_note = new_note
             voiced_notes.append(new_note)
         
@@ -160,7 +235,7 @@ class Voicer:
         # Drop the second to last note down an octave
         result = close_voiced.copy()
         drop_idx = len(result) - 2
-        result[drop_idx] = Note(result[drop_idx].name, result[drop_idx].octave - 1)
+        result[drop_idx] = result[drop_idx].transpose(-1)
         
         return result
     
@@ -171,10 +246,10 @@ class Voicer:
             return []
             
         root = chord_notes[0]
-        voiced_notes = [Note(root.name, 0)]  # Root in base octave
+        voiced_notes = [Note(root.number, 0)]  # Root in base octave
         
         for i, note in enumerate(chord_notes[1:], 1):
-            new_note = Note(note.name, i)  # Each subsequent note up an octave
+            new_note = Note(note.number, i)  # Each subsequent note up an octave
             voiced_notes.append(new_note)
         
         return voiced_notes
@@ -188,7 +263,7 @@ class Voicer:
         close_voiced = Voicer.close_position(chord_notes)
         result = close_voiced.copy()
         # Drop the last note down an octave
-        result[-1] = Note(result[-1].name, result[-1].octave - 1)
+        result[-1] = result[-1].transpose(-1)
         return result
     
     @staticmethod
@@ -200,7 +275,7 @@ class Voicer:
         close_voiced = Voicer.close_position(chord_notes)
         result = close_voiced.copy()
         # Raise the first note up an octave
-        result[0] = Note(result[0].name, result[0].octave + 1)
+        result[0] = result[0].transpose(1)
         return result
     
     @staticmethod
@@ -227,14 +302,14 @@ class Voicer:
         for i in range(len(base_voicing)):
             test_voicing = base_voicing.copy()
             # Try moving note up an octave
-            test_voicing[i] = Note(test_voicing[i].name, test_voicing[i].octave + 1)
+            test_voicing[i] = test_voicing[i].transpose(1)
             total = calculate_total_intervals(test_voicing)
             if total < min_total:
                 min_total = total
                 best_voicing = test_voicing.copy()
                 
             # Try moving note down an octave
-            test_voicing[i] = Note(test_voicing[i].name, test_voicing[i].octave - 1)
+            test_voicing[i] = test_voicing[i].transpose(-1)
             total = calculate_total_intervals(test_voicing)
             if total < min_total:
                 min_total = total
@@ -245,12 +320,245 @@ class Voicer:
     @staticmethod
     def shift_octave(chord_notes, offset):
         """Shift all notes up or down by a given number of octaves."""
-        return [Note(note.name, note.octave + offset) for note in chord_notes]
+        return [note.transpose(offset) for note in chord_notes]
+
+    @staticmethod
+    def optimal(chord_notes, cost='intervals', octave_range=(-1, 1), previous=None, fix_root=True):
+        """
+        Best octave for every note under a cost function, found exactly.
+        
+        Args:
+            chord_notes: notes in voice order (only their pitch classes are used)
+            cost: 'intervals' (sum of adjacent intervals), 'span' (lowest to
+                highest note), 'voice_leading' (movement from `previous`) or
+                'smooth' (intervals plus voice leading)
+            octave_range: inclusive (lowest, highest) octave to consider
+            previous: the chord being moved from, for the voice-leading costs
+            fix_root: keep the first note in octave 0
+        
+        Results are memoized per pitch-class sequence and options.
+        """
+        if not chord_notes:
+            return []
+        if cost not in OPTIMAL_COSTS:
+            raise ValueError(f"Invalid cost: {cost}. Must be one of {OPTIMAL_COSTS}")
+        if cost in ('voice_leading', 'smooth') and not previous:
+            raise ValueError(f"Cost '{cost}' needs a previous chord")
+        previous_midi = tuple(note.get_midi_number() for note in previous) if previous else None
+        octaves = _optimal_octaves(
+            tuple(note.number for note in chord_notes),
+            cost,
+            tuple(octave_range),
+            previous_midi,
+            fix_root
+        )
+        return [Note(note.number, octave) for note, octave in zip(chord_notes, octaves)]
 
     @staticmethod
     def get_available_voicings():
         """Returns list of available voicing options."""
-        return ['close', 'drop2', 'spread', 'drop_top', 'raise_bottom', 'minimal_intervals', 'shift_octave']
+        return ['close', 'drop2', 'spread', 'drop_top', 'raise_bottom', 'minimal_intervals', 'optimal', 'shift_octave']
+
+
+def _voice_leading_candidates(chords, octave_range):
+    """Candidate voicings of each chord as (candidates x notes) MIDI arrays."""
+    shifts = 12 * np.arange(octave_range[0], octave_range[1] + 1)
+    # Shift the unshifted candidates first so ties keep the closest octave
+    shifts = shifts[np.argsort(np.abs(shifts), kind='stable')]
+    
+    # Preset voicings are computed for all chords of a size at once
+    presets = [None] * len(chords)
+    by_size = {}
+    for i, chord in enumerate(chords):
+        by_size.setdefault(len(chord), []).append(i)
+    for indices in by_size.values():
+        pitch_classes = np.array([[note.number for note in chords[i]] for i in indices])
+        voiced = np.stack([voicing for _, voicing in ArrayVoicer.voice_all(pitch_classes)], axis=1)
+        for row, i in enumerate(indices):
+            presets[i] = voiced[row]
+    
+    candidates = []
+    for chord, preset in zip(chords, presets):
+        given = np.array([[note.get_midi_number() for note in chord]])
+        voicings = np.concatenate((given, preset))
+        shifted = (voicings[None, :, :] + shifts[:, None, None]).reshape(-1, len(chord))
+        # Drop duplicates, keeping the first (preferred) occurrence
+        _, first = np.unique(shifted, axis=0, return_index=True)
+        candidates.append(shifted[np.sort(first)])
+    return candidates
+
+
+def _movement(previous, current):
+    """
+    Voice movement between every pair of candidates, as a matrix.
+    
+    Chords of equal size move voice by voice; otherwise each voice of the
+    new chord is charged the distance to the nearest note of the old one.
+    """
+    if previous.shape[1] == current.shape[1]:
+        return np.abs(previous[:, None, :] - current[None, :, :]).sum(axis=2)
+    distance = np.abs(current[None, :, :, None] - previous[:, None, None, :])
+    return distance.min(axis=3).sum(axis=2)
+
+
+OPTIMAL_COSTS = ('intervals', 'span', 'voice_leading', 'smooth')
+
+
+@lru_cache(maxsize=4096)
+def _optimal_octaves(pitch_classes, cost, octave_range, previous, fix_root):
+    """Octave per voice minimizing `cost`; see Voicer.optimal."""
+    lowest, highest = octave_range
+    # Ties go to the octave nearest 0
+    choices = sorted(range(lowest, highest + 1), key=lambda octave: (abs(octave), octave))
+    options = [[0] if (fix_root and i == 0) else choices for i in range(len(pitch_classes))]
+    
+    if cost == 'span':
+        return _min_span_octaves(pitch_classes, options)
+    
+    def movement(i, midi):
+        if cost == 'intervals':
+            return 0
+        if len(previous) == len(pitch_classes):
+            return abs(midi - previous[i])
+        return min(abs(midi - p) for p in previous)
+    interval_weight = 0 if cost == 'voice_leading' else 1
+    
+    # Viterbi over voices: best[octave] is the cheapest voicing of the
+    # voices so far with the current voice in that octave
+    best = {o: (movement(0, pitch_classes[0] + 12 * o), (o,)) for o in options[0]}
+    for i in range(1, len(pitch_classes)):
+        step = {}
+        for o in options[i]:
+            midi = pitch_classes[i] + 12 * o
+            unary = movement(i, midi)
+            for p, (total, path) in best.items():
+                candidate = total + unary + interval_weight * abs(midi - (pitch_classes[i - 1] + 12 * p))
+                if o not in step or candidate < step[o][0]:
+                    step[o] = (candidate, path + (o,))
+        best = step
+    return min(best.values(), key=lambda entry: entry[0])[1]
+
+
+def _min_span_octaves(pitch_classes, options):
+    """
+    Octaves minimizing highest - lowest note.
+    
+    For every candidate lowest note L, each voice takes its lowest option at
+    or above L; the best L over all candidates gives the exact minimum span.
+    """
+    notes = [sorted(pc + 12 * o for o in opts) for pc, opts in zip(pitch_classes, options)]
+    best_span, best_midi = None, None
+    for low in sorted({midi for voice in notes for midi in voice}):
+        chosen = []
+        for voice in notes:
+            above = [midi for midi in voice if midi >= low]
+            if not above:
+                break
+            chosen.append(above[0])
+        else:
+            span = max(chosen) - min(chosen)
+            if best_span is None or span < best_span:
+                best_span, best_midi = span, chosen
+    return tuple((midi - pc) // 12 for midi, pc in zip(best_midi, pitch_classes))
+
+
+class ArrayVoicer:
+    """
+    Vectorized counterpart of Voicer.
+    
+    Chords are (chords x notes) int arrays: pitch classes in, MIDI numbers
+    (as returned by Note.get_midi_number) out. Each method voices every row
+    at once and matches the corresponding Voicer method note for note.
+    """
+    
+    @staticmethod
+    def close_position(pitch_classes):
+        """Close position: move up an octave whenever the pitch class wraps."""
+        pitch_classes = np.asarray(pitch_classes)
+        wraps = np.diff(pitch_classes, axis=1) < 0
+        octaves = np.zeros(pitch_classes.shape, dtype=int)
+        np.cumsum(wraps, axis=1, out=octaves[:, 1:])
+        return pitch_classes + 12 * octaves
+    
+    @staticmethod
+    def drop_2(pitch_classes):
+        return ArrayVoicer._drop_2(ArrayVoicer.close_position(pitch_classes))
+    
+    @staticmethod
+    def drop_top(pitch_classes):
+        return ArrayVoicer._drop_top(ArrayVoicer.close_position(pitch_classes))
+    
+    @staticmethod
+    def raise_bottom(pitch_classes):
+        return ArrayVoicer._raise_bottom(ArrayVoicer.close_position(pitch_classes))
+    
+    @staticmethod
+    def spread(pitch_classes):
+        pitch_classes = np.asarray(pitch_classes)
+        return pitch_classes + 12 * np.arange(pitch_classes.shape[1])
+    
+    @staticmethod
+    def minimal_intervals(pitch_classes):
+        return ArrayVoicer._minimal_intervals(ArrayVoicer.close_position(pitch_classes))
+    
+    NAMES = ("Close Position", "Drop 2", "Drop Top", "Raise Bottom", "Minimal Intervals", "Spread")
+    
+    @staticmethod
+    def voice_all(pitch_classes):
+        """All voicings, in Harmonizer order, as a list of (name, array)."""
+        close = ArrayVoicer.close_position(pitch_classes)
+        return list(zip(ArrayVoicer.NAMES, (
+            close,
+            ArrayVoicer._drop_2(close),
+            ArrayVoicer._drop_top(close),
+            ArrayVoicer._raise_bottom(close),
+            ArrayVoicer._minimal_intervals(close),
+            ArrayVoicer.spread(pitch_classes),
+        )))
+    
+    # The helpers below derive a voicing from close position without
+    # modifying it
+    
+    @staticmethod
+    def _drop_2(close):
+        voiced = close.copy()
+        if voiced.shape[1] >= 3:
+            voiced[:, -2] -= 12
+        return voiced
+    
+    @staticmethod
+    def _drop_top(close):
+        voiced = close.copy()
+        if voiced.shape[1] >= 2:
+            voiced[:, -1] -= 12
+        return voiced
+    
+    @staticmethod
+    def _raise_bottom(close):
+        voiced = close.copy()
+        if voiced.shape[1] >= 2:
+            voiced[:, 0] += 12
+        return voiced
+    
+    @staticmethod
+    def _minimal_intervals(close):
+        """
+        Same search as Voicer.minimal_intervals: close position with one
+        note raised an octave, keeping the first candidate with the lowest
+        total interval in the order Voicer tries them.
+        """
+        rows, size = close.shape
+        if size < 2:
+            return close.copy()
+        
+        # Voicer tries [up_0, base, up_1, base, ...]; np.argmin keeps the
+        # first minimum, matching its strict < comparison
+        candidates = np.repeat(close[:, None, :], 2 * size, axis=1)
+        candidates[:, 2 * np.arange(size), np.arange(size)] += 12
+        
+        totals = np.abs(np.diff(candidates, axis=2)).sum(axis=2)
+        best = np.argmin(totals, axis=1)
+        return candidates[np.arange(rows), best]
 
 
 # Example usage
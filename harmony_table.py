@@ -0,0 +1,139 @@
+"""
+Precomputed voicings for every pitch-class set.
+
+Harmonizing depends only on the input pitch classes and the chord size, so
+the voicings of all 4095 non-empty sets (in ascending order, without
+repeats) are computed once and stored as one flat int16 array of MIDI
+numbers. The file is memory-mapped read-only, so every worker process
+shares the same pages instead of holding its own copy.
+
+Inputs that are not an ascending set fall back to voicing on request.
+"""
+
+import os
+import tempfile
+import numpy as np
+
+from atomic_file import atomic_write
+from harmonizer import ArrayVoicer
+
+# Bump when the voicing rules change so stale tables are rebuilt
+TABLE_VERSION = 1
+PITCH_CLASSES = 12
+MAX_CHORD_SIZE = PITCH_CLASSES
+NUM_VOICINGS = len(ArrayVoicer.NAMES)
+
+
+def _set_sizes():
+    """Number of pitch classes in every set, indexed by its bit mask."""
+    masks = np.arange(1 << PITCH_CLASSES)
+    bits = (masks[:, None] >> np.arange(PITCH_CLASSES)) & 1
+    return bits.sum(axis=1)
+
+
+def _offsets():
+    """
+    Start of each (mask, chord size) block in the flat table.
+
+    A block holds (set size x voicings x chord size) MIDI numbers, and is
+    empty when the chord size is not between 2 and the set size.
+    """
+    set_sizes = _set_sizes()[:, None]
+    chord_sizes = np.arange(MAX_CHORD_SIZE + 1)[None, :]
+    counts = np.where(
+        (chord_sizes >= 2) & (chord_sizes <= set_sizes),
+        set_sizes * NUM_VOICINGS * chord_sizes,
+        0
+    )
+    ends = np.cumsum(counts.ravel())
+    return (ends - counts.ravel()).reshape(counts.shape), int(ends[-1])
+
+
+def build():
+    """Voice every set at every chord size, returning the flat table."""
+    offsets, total = _offsets()
+    table = np.empty(total, dtype=np.int16)
+    masks = np.arange(1, 1 << PITCH_CLASSES)
+    set_sizes = _set_sizes()[masks]
+
+    for set_size in range(2, PITCH_CLASSES + 1):
+        group = masks[set_sizes == set_size]
+        # Ascending pitch classes of every set in the group
+        bits = (group[:, None] >> np.arange(PITCH_CLASSES)) & 1
+        pitch_classes = np.nonzero(bits)[1].reshape(len(group), set_size)
+        for chord_size in range(2, set_size + 1):
+            # Same chord construction as Harmonizer._build_chords
+            indices = (np.arange(set_size)[:, None] + 2 * np.arange(chord_size)) % set_size
+            chords = pitch_classes[:, indices].reshape(-1, chord_size)
+            voiced = np.stack([voicing for _, voicing in ArrayVoicer.voice_all(chords)], axis=1)
+            voiced = voiced.reshape(len(group), -1)
+            block = set_size * NUM_VOICINGS * chord_size
+            positions = offsets[group, chord_size][:, None] + np.arange(block)
+            table[positions] = voiced
+    return table
+
+
+class HarmonyTable:
+    """Read-only lookup of precomputed voicings."""
+
+    def __init__(self, table):
+        self.table = table
+        self.offsets, _ = _offsets()
+
+    @classmethod
+    def open(cls, path):
+        """
+        Memory-map the table at `path`, building and saving it first if it
+        does not exist yet or is not a complete table (truncated, or
+        written with a different layout).
+        """
+        table = cls._load(path)
+        if table is None:
+            cls.save(build(), path)
+            table = np.load(path, mmap_mode='r')
+        return cls(table)
+
+    @staticmethod
+    def _load(path):
+        """The table mapped from `path`, or None if it is missing or invalid."""
+        try:
+            table = np.load(path, mmap_mode='r')
+        except (OSError, ValueError):
+            return None
+        _, total = _offsets()
+        if table.dtype != np.int16 or table.shape != (total,):
+            return None
+        return table
+
+    @staticmethod
+    def save(table, path):
+        directory = os.path.dirname(path) or '.'
+        os.makedirs(directory, exist_ok=True)
+        # Concurrent workers never map a partially written table
+        atomic_write(path, lambda f: np.save(f, table))
+
+    def lookup(self, pitch_classes, chord_size):
+        """
+        Voicings for `pitch_classes` as a (roots x voicings x chord size)
+        array of MIDI numbers, or None if the input is not an ascending set.
+        """
+        if any(a >= b for a, b in zip(pitch_classes, pitch_classes[1:])):
+            return None
+        if not 2 <= chord_size <= len(pitch_classes):
+            return None
+        mask = sum(1 << pc for pc in pitch_classes)
+        start = self.offsets[mask, chord_size]
+        shape = (len(pitch_classes), NUM_VOICINGS, chord_size)
+        return self.table[start:start + np.prod(shape)].reshape(shape)
+
+
+def default_path(directory=None):
+    directory = directory or tempfile.gettempdir()
+    return os.path.join(directory, f'harmony-table-v{TABLE_VERSION}.npy')
+
+
+if __name__ == '__main__':
+    import sys
+    path = sys.argv[1] if len(sys.argv) > 1 else default_path()
+    HarmonyTable.save(build(), path)
+    print(f"Wrote {path}")
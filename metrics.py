@@ -0,0 +1,306 @@
+"""
+Request instrumentation: stage timings, Prometheus-style metrics and an
+opt-in sampling profiler.
+
+Metrics live in the process and are not aggregated. Under gunicorn each
+scrape of /metrics is answered by whichever worker accepts it, so it shows
+that one worker's counters, not totals for the server; successive scrapes
+may come from different workers and counters can appear to go backwards.
+"""
+
+import os
+import sys
+import time
+import threading
+from collections import Counter
+from contextlib import contextmanager
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+BYTE_BUCKETS = tuple(1024 * 4 ** i for i in range(10))  # 1 KB to 256 MB
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (
+        (name, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for name, value in pairs
+    )
+    return '{' + ','.join(f'{name}="{value}"' for name, value in escaped) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class CounterMetric:
+    """Monotonic counter with optional labels."""
+
+    type = 'counter'
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels[name] for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            return [(self.name, key, (), value) for key, value in self._values.items()]
+
+    def reset(self):
+        with self._lock:
+            self._values = {}
+
+
+class Histogram:
+    """Cumulative histogram with optional labels, as in Prometheus."""
+
+    type = 'histogram'
+
+    def __init__(self, name, help, buckets, labelnames=()):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels[name] for name in self.labelnames)
+        with self._lock:
+            counts, total = self._values.get(key, ([0] * len(self.buckets), 0.0))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            self._values[key] = (counts, total + value)
+
+    def samples(self):
+        samples = []
+        with self._lock:
+            for key, (counts, total) in self._values.items():
+                cumulative = 0
+                for bound, count in zip(self.buckets, counts):
+                    cumulative += count
+                    samples.append((self.name + '_bucket', key, (('le', _format_value(float(bound))),), cumulative))
+                samples.append((self.name + '_sum', key, (), total))
+                samples.append((self.name + '_count', key, (), cumulative))
+        return samples
+
+    def reset(self):
+        with self._lock:
+            self._values = {}
+
+
+class Registry:
+    """Collection of metrics, plus callbacks that report gauges at scrape time."""
+
+    def __init__(self):
+        self.metrics = []
+        self.collectors = []
+
+    def counter(self, name, help, labelnames=()):
+        metric = CounterMetric(name, help, labelnames)
+        self.metrics.append(metric)
+        return metric
+
+    def histogram(self, name, help, buckets, labelnames=()):
+        metric = Histogram(name, help, buckets, labelnames)
+        self.metrics.append(metric)
+        return metric
+
+    def reset(self):
+        """Zero every metric, e.g. in a worker forked after the master did some work."""
+        for metric in self.metrics:
+            metric.reset()
+
+    def register_collector(self, collect):
+        """
+        Add a callback returning gauge families as a list of
+        (name, help, labelnames, [(label values, value), ...]).
+        """
+        self.collectors.append(collect)
+
+    def exposition(self):
+        """All metrics in the Prometheus text exposition format."""
+        lines = []
+        for metric in self.metrics:
+            lines.append(f'# HELP {metric.name} {metric.help}')
+            lines.append(f'# TYPE {metric.name} {metric.type}')
+            for name, key, extra, value in metric.samples():
+                lines.append(f'{name}{_format_labels(metric.labelnames, key, extra)} {_format_value(value)}')
+        for collect in self.collectors:
+            for name, help, labelnames, values in collect():
+                lines.append(f'# HELP {name} {help}')
+                lines.append(f'# TYPE {name} gauge')
+                for key, value in values:
+                    lines.append(f'{name}{_format_labels(labelnames, key)} {_format_value(value)}')
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+request_duration = registry.histogram(
+    'harmonizer_request_duration_seconds', 'Time to produce each response.',
+    LATENCY_BUCKETS, ('route', 'method', 'status')
+)
+response_bytes = registry.histogram(
+    'harmonizer_response_bytes', 'Size of each response body, when known up front.',
+    BYTE_BUCKETS, ('route',)
+)
+stage_duration = registry.histogram(
+    'harmonizer_stage_duration_seconds', 'Time spent in each stage of a request; stages may nest.',
+    LATENCY_BUCKETS, ('route', 'stage')
+)
+encoded_bytes = registry.histogram(
+    'harmonizer_encoded_audio_bytes', 'Size of each encoded audio file.',
+    BYTE_BUCKETS, ('format',)
+)
+samples_synthesized = registry.counter(
+    'harmonizer_samples_synthesized_total', 'Oscillator samples rendered (one per note per sample).',
+    ('waveform',)
+)
+
+
+# Per-thread record of the request being handled, so stages can be tagged
+# with their route and reported back in the response
+_local = threading.local()
+
+
+def start_request(route):
+    """Start recording stages for a request handled on this thread."""
+    _local.route = route
+    _local.stages = []
+
+
+def request_stages():
+    """(stage, seconds) pairs recorded so far for this thread's request."""
+    return list(getattr(_local, 'stages', None) or [])
+
+
+def finish_request():
+    _local.route = None
+    _local.stages = None
+
+
+@contextmanager
+def stage(name):
+    """Time a block as stage `name` of the current request."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        # Work outside a request, e.g. prefetching on the render pool
+        route = getattr(_local, 'route', None) or 'background'
+        stage_duration.observe(elapsed, route=route, stage=name)
+        stages = getattr(_local, 'stages', None)
+        if stages is not None:
+            stages.append((name, elapsed))
+
+
+def server_timing(stages):
+    """Server-Timing header value for a request's stages (durations in ms)."""
+    totals = {}
+    for name, elapsed in stages:
+        totals[name] = totals.get(name, 0.0) + elapsed
+    return ', '.join(f'{name};dur={elapsed * 1000:.2f}' for name, elapsed in totals.items())
+
+
+def process_start_time():
+    """
+    Wall-clock time this process started, read from /proc on Linux so it
+    includes interpreter startup and imports (the current time elsewhere).
+    A forked worker reports the time it was forked.
+    """
+    try:
+        with open('/proc/self/stat') as f:
+            # Fields after the command name, which may itself contain spaces
+            fields = f.read().rsplit(')', 1)[1].split()
+        with open('/proc/uptime') as f:
+            uptime = float(f.read().split()[0])
+        return time.time() - uptime + int(fields[19]) / os.sysconf('SC_CLK_TCK')
+    except (OSError, ValueError, IndexError):
+        return time.time()
+
+
+class SamplingProfiler:
+    """
+    Samples the stacks of selected threads at a fixed interval.
+
+    A single background thread runs while any thread is being profiled.
+    Stacks are aggregated in the collapsed "frame;frame;frame count"
+    format read by flamegraph.pl, speedscope and similar tools.
+    """
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self._profiles = {}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+
+    def start(self, thread_id=None):
+        thread_id = thread_id or threading.get_ident()
+        with self._lock:
+            self._profiles[thread_id] = Counter()
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='sampling-profiler', daemon=True)
+                self._thread.start()
+        self._wakeup.set()
+
+    def stop(self, thread_id=None):
+        """Stop profiling a thread and return its collapsed stack counts."""
+        thread_id = thread_id or threading.get_ident()
+        with self._lock:
+            return self._profiles.pop(thread_id, Counter())
+
+    def _run(self):
+        while True:
+            with self._lock:
+                idle = not self._profiles
+                if idle:
+                    self._wakeup.clear()
+            if idle:
+                self._wakeup.wait()
+                continue
+            frames = sys._current_frames()
+            with self._lock:
+                for thread_id, counts in self._profiles.items():
+                    frame = frames.get(thread_id)
+                    if frame is not None:
+                        counts[_collapse(frame)] += 1
+            time.sleep(self.interval)
+
+
+def _collapse(frame):
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})')
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+
+def write_profile(counts, directory, label):
+    """Write collapsed stacks to `directory`, returning the file path."""
+    os.makedirs(directory, exist_ok=True)
+    safe_label = ''.join(c if c.isalnum() or c in '-_' else '_' for c in label).strip('_')
+    path = os.path.join(
+        directory,
+        f'{time.strftime("%Y%m%d-%H%M%S")}-{safe_label}-{os.getpid()}-{threading.get_ident()}.folded'
+    )
+    with open(path, 'w') as f:
+        for stack, count in counts.most_common():
+            f.write(f'{stack} {count}\n')
+    return path
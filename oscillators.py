@@ -0,0 +1,216 @@
+import threading
+import numpy as np
+from functools import lru_cache
+
+import metrics
+
+TABLE_SIZE = 2048
+MAX_HARMONICS = TABLE_SIZE // 4
+WAVEFORMS = ('sine', 'sawtooth', 'square', 'pwm')
+# Most notes in one chord, wherever chords are accepted
+MAX_CHORD_SIZE = 12
+# Frequency ratios of the left and right voices of stereo pwm chords
+PWM_DETUNE = (0.99, 1.01)
+BLOCK_ELEMENTS = 1 << 14
+
+
+def check_waveform(waveform):
+    """Return `waveform`, or raise ValueError if it is not one of WAVEFORMS."""
+    if waveform not in WAVEFORMS:
+        raise ValueError(f"Invalid waveform: {waveform}. Must be one of {WAVEFORMS}")
+    return waveform
+
+
+def pwm_channels(frequencies):
+    """Left and right channel frequencies of a stereo pwm chord."""
+    return [[f * ratio for f in frequencies] for ratio in PWM_DETUNE]
+
+
+@lru_cache(maxsize=None)
+def _wavetable(shape, harmonics):
+    """
+    Build one period of a band-limited waveform from its Fourier series.
+
+    Returns the table and its per-point slope. Two guard points repeat the
+    start of the period so interpolation never has to wrap around, even when
+    a wrapped phase rounds up to exactly 1.0.
+    """
+    spectrum = np.zeros(TABLE_SIZE // 2 + 1, dtype=complex)
+    k = np.arange(1, harmonics + 1)
+    if shape == 'sine':
+        amplitudes = np.array([1.0])
+        k = k[:1]
+    elif shape == 'sawtooth':
+        # Rising ramp from -1 to 1, matching scipy.signal.sawtooth
+        amplitudes = -2 / (np.pi * k)
+    elif shape == 'square':
+        # Odd harmonics only, high for the first half of the period
+        k = k[k % 2 == 1]
+        amplitudes = 4 / (np.pi * k)
+    else:
+        raise ValueError(f"Unknown wavetable shape: {shape}")
+
+    # A sine term of amplitude a at bin k is -1j * a * N / 2 for irfft
+    spectrum[k] = -1j * amplitudes * TABLE_SIZE / 2
+    table = np.fft.irfft(spectrum, TABLE_SIZE)
+    table = np.concatenate((table, table[:2]))
+    return table, np.diff(table)
+
+
+def _harmonic_limit(frequency, sample_rate):
+    """Number of harmonics below Nyquist, rounded down to a power of two."""
+    harmonics = int(sample_rate / 2 // frequency) if frequency > 0 else MAX_HARMONICS
+    if harmonics < 1:
+        return 1
+    return min(1 << (harmonics.bit_length() - 1), MAX_HARMONICS)
+
+
+_scratch = threading.local()
+
+
+def _buffer(name, dtype, rows, columns):
+    """
+    A (rows x columns) view of a per-thread scratch array.
+
+    Renders work in blocks of at most BLOCK_ELEMENTS samples, so these
+    buffers are allocated once per thread and reused by every call.
+    """
+    buffers = getattr(_scratch, 'buffers', None)
+    if buffers is None:
+        buffers = _scratch.buffers = {}
+    buffer = buffers.get(name)
+    if buffer is None:
+        buffer = buffers[name] = np.empty(BLOCK_ELEMENTS, dtype=dtype)
+    return buffer[:rows * columns].reshape(rows, columns)
+
+
+def _read(wavetable, position, out):
+    """
+    Read a wavetable at normalized `position` (0-1) into `out` with linear
+    interpolation. `position` is overwritten.
+    """
+    table, slope = wavetable
+    index = _buffer('index', np.intp, *position.shape)
+    position *= TABLE_SIZE
+    np.copyto(index, position, casting='unsafe')
+    position -= index
+    # take() buffers its output in the default mode='raise'; the indices
+    # are always in range, so 'clip' writes straight into the scratch arrays
+    slope.take(index, out=out, mode='clip')
+    out *= position
+    # The fractional position is no longer needed; reuse it for the table values
+    table.take(index, out=position, mode='clip')
+    out += position
+    return out
+
+
+def _phase(increments, start, stop):
+    """Phase accumulator for samples start..stop, wrapped to [0, 1)."""
+    phase = _buffer('phase', float, len(increments), stop - start)
+    time = _buffer('time', float, 1, stop - start)
+    np.add(np.arange(stop - start), start, out=time, casting='unsafe')
+    np.multiply(increments[:, None], time, out=phase)
+    phase -= np.floor(phase)
+    return phase
+
+
+def _blocks(frequencies, num_samples, sample_rate, waveform, duty_cycle, offset=0):
+    """
+    Render oscillators block by block.
+
+    Yields (rows, start, stop, samples) where `samples` holds the output
+    of the oscillators at `rows` for samples start..stop. It is a scratch
+    buffer, only valid until the next block is requested. Oscillators are
+    at phase zero `offset` samples before the first sample.
+    """
+    check_waveform(waveform)
+    frequencies = np.asarray(frequencies, dtype=float)
+    metrics.samples_synthesized.inc(len(frequencies) * num_samples, waveform=waveform)
+
+    # Frequencies that share a harmonic limit are read from the same table
+    if waveform == 'sine':
+        limits = np.ones(len(frequencies), dtype=int)
+    else:
+        limits = np.array([_harmonic_limit(f, sample_rate) for f in frequencies], dtype=int)
+    increments = frequencies / sample_rate
+
+    for harmonics in np.unique(limits):
+        rows = np.nonzero(limits == harmonics)[0]
+        wavetable = _wavetable('sawtooth' if waveform == 'pwm' else waveform, int(harmonics))
+        # Render in blocks of samples so the scratch arrays stay cache-sized
+        block = max(1, BLOCK_ELEMENTS // len(rows))
+        for start in range(0, num_samples, block):
+            stop = min(start + block, num_samples)
+            phase = _phase(increments[rows], offset + start, offset + stop)
+            samples = _buffer('samples', float, *phase.shape)
+            if waveform == 'pwm':
+                # A pulse is the difference of two ramps offset by the duty cycle
+                shifted = _buffer('shifted', float, *phase.shape)
+                np.subtract(phase, duty_cycle, out=shifted)
+                shifted -= np.floor(shifted)
+                _read(wavetable, shifted, samples)
+                ramp = _buffer('ramp', float, *phase.shape)
+                samples -= _read(wavetable, phase, ramp)
+                samples += 2 * duty_cycle - 1
+            else:
+                _read(wavetable, phase, samples)
+            yield rows, start, stop, samples
+
+
+def oscillate(frequencies, num_samples, sample_rate=44100, waveform='sine', duty_cycle=0.5):
+    """
+    Render one oscillator per frequency from band-limited wavetables.
+
+    Args:
+        frequencies: sequence of frequencies in Hz
+        num_samples: number of samples to render per oscillator
+        sample_rate: sampling rate in Hz
+        waveform: one of WAVEFORMS
+        duty_cycle: fraction of each period spent high ('pwm' only)
+
+    Returns:
+        float64 array of shape (len(frequencies), num_samples)
+    """
+    output = np.empty((len(frequencies), num_samples))
+    for rows, start, stop, samples in _blocks(frequencies, num_samples, sample_rate, waveform, duty_cycle):
+        output[rows, start:stop] = samples
+    return output
+
+
+def mix(frequencies, out, sample_rate=44100, waveform='sine', duty_cycle=0.5, gain=1.0, offset=0):
+    """
+    Add the sum of one oscillator per frequency, times `gain`, to `out`.
+
+    `out` is a 1-D array of any float dtype (a channel of a larger buffer
+    works), so a chord is mixed straight into its place in the output
+    without allocating per-note or full-length temporaries. With `offset`,
+    `out` continues a note that started `offset` samples earlier.
+    """
+    for _, start, stop, samples in _blocks(frequencies, len(out), sample_rate, waveform, duty_cycle, offset):
+        block = _buffer('mixed', float, 1, stop - start)[0]
+        np.sum(samples, axis=0, out=block)
+        block *= gain
+        np.add(out[start:stop], block, out=out[start:stop], casting='unsafe')
+    return out
+
+
+@lru_cache(maxsize=None)
+def peak_amplitude(waveform):
+    """
+    Upper bound on the absolute value of any oscillator output.
+
+    Band-limited sawtooth and square tables overshoot 1 near their edges
+    (Gibbs ringing); averaging voices never exceeds this bound.
+    """
+    check_waveform(waveform)
+    if waveform == 'sine':
+        return 1.0
+    # A 50% pulse is a square wave; other duty cycles ring no more than two ramps
+    shape = 'sawtooth' if waveform == 'sawtooth' else 'square'
+    peak = 0.0
+    harmonics = 1
+    while harmonics <= MAX_HARMONICS:
+        table, _ = _wavetable(shape, harmonics)
+        peak = max(peak, float(np.abs(table).max()))
+        harmonics *= 2
+    return peak
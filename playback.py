@@ -0,0 +1,335 @@
+"""
+Real-time playback of chord sequences.
+
+The engine synthesizes each audio block just in time inside the sound
+card's callback, from the same band-limited wavetables as the file
+renderer, so playback starts immediately and tempo changes take effect on
+the next block. Everything the callback needs (voice tables, scratch
+buffers) is prepared up front, so it does no array allocation.
+
+Without a sound device, `PlaybackEngine.render` drives the same callback
+into a buffer:
+
+    python playback.py "C E G" "F A C" - "G B D F" --tempo 100
+    python playback.py "C E G" "F A C" --output preview.wav
+"""
+
+import argparse
+import sys
+import threading
+import numpy as np
+
+import oscillators
+from audio_utils import is_stereo, to_pcm16, wav_header
+from harmonizer import Note
+
+MAX_VOICES = 2 * oscillators.MAX_CHORD_SIZE  # pwm renders a detuned voice per channel
+CHANNELS = 2
+DUTY_CYCLE = 0.5
+
+
+class _Schedule:
+    """
+    Per-bar voice parameters for a sequence, padded to MAX_VOICES.
+
+    Wavetables for every voice are packed into one bank so a single take()
+    reads all voices of a bar, each voice offset to its own table.
+    """
+
+    def __init__(self, chord_sequence, waveform, sample_rate):
+        oscillators.check_waveform(waveform)
+        bars = len(chord_sequence)
+        synth_channels = 2 if is_stereo(waveform) else 1
+        self.waveform = waveform
+        self.synth_channels = synth_channels
+        self.gain = 1.0 / oscillators.peak_amplitude(waveform)
+        self.voices = np.zeros(bars, dtype=np.intp)
+        self.increments = np.zeros((bars, MAX_VOICES))
+        self.bases = np.zeros((bars, MAX_VOICES))
+        self.weights = np.zeros((bars, synth_channels, MAX_VOICES))
+
+        shape = 'sawtooth' if waveform == 'pwm' else waveform
+        stride = oscillators.TABLE_SIZE + 2
+        tables = {}
+        for bar, chord in enumerate(chord_sequence):
+            if not chord:
+                continue
+            if len(chord) > oscillators.MAX_CHORD_SIZE:
+                raise ValueError(f"Chords can have at most {oscillators.MAX_CHORD_SIZE} notes")
+            frequencies = [note.frequency for note in chord]
+            if waveform == 'pwm':
+                # Left channel detuned lower, right higher
+                channel_frequencies = oscillators.pwm_channels(frequencies)
+            else:
+                channel_frequencies = [frequencies]
+            voice = 0
+            for channel, channel_freqs in enumerate(channel_frequencies):
+                for frequency in channel_freqs:
+                    harmonics = 1 if waveform == 'sine' else oscillators._harmonic_limit(frequency, sample_rate)
+                    table = tables.setdefault(harmonics, len(tables))
+                    self.increments[bar, voice] = frequency / sample_rate
+                    self.bases[bar, voice] = table * stride
+                    self.weights[bar, channel, voice] = 1.0 / len(chord)
+                    voice += 1
+            self.voices[bar] = voice
+
+        bank = [oscillators._wavetable(shape, harmonics) for harmonics in sorted(tables, key=tables.get)]
+        if not bank:
+            bank = [oscillators._wavetable(shape, 1)]
+        self.table = np.concatenate([table for table, _ in bank])
+        # Slopes are padded to the table stride so both share voice offsets
+        self.slope = np.concatenate([np.append(slope, 0.0) for _, slope in bank])
+
+    def __len__(self):
+        return len(self.voices)
+
+
+class PlaybackEngine:
+    """
+    Callback-driven player for a chord sequence (lists of Notes, or None
+    for a rest), one chord per 4-beat bar.
+
+    Output is stereo float32 at `sample_rate`, produced `block_size`
+    frames at a time. Bars start at phase zero, as in the file renderer,
+    and are scaled by a fixed gain so loudness does not depend on what
+    comes next.
+    """
+
+    def __init__(self, chord_sequence, tempo=120, waveform='sine', sample_rate=44100, block_size=256, loop=False):
+        self.sample_rate = sample_rate
+        self.block_size = block_size
+        self.loop = loop
+        self.finished = False
+        self._lock = threading.Lock()
+        self._stream = None
+        self._stop_exception = None
+
+        # Scratch buffers for one block of every voice; views of these are
+        # reshaped to the current size, so they stay contiguous
+        elements = MAX_VOICES * block_size
+        self._ramp = np.arange(block_size, dtype=float)
+        self._time = np.empty(block_size)
+        self._phase = np.empty(elements)
+        self._shifted = np.empty(elements)
+        self._floor = np.empty(elements)
+        self._samples = np.empty(elements)
+        self._other = np.empty(elements)
+        self._index = np.empty(elements, dtype=np.intp)
+        self._mix = np.empty(CHANNELS * block_size)
+
+        self.set_sequence(chord_sequence, waveform)
+        self._bar = 0
+        self._position = 0
+        self._tempo = None
+        self._pending_tempo = None
+        self.set_tempo(tempo)
+        self._apply_tempo()
+
+    def set_sequence(self, chord_sequence, waveform=None):
+        """Replace the sequence (and optionally waveform) from the next block on."""
+        schedule = _Schedule(chord_sequence, waveform or self._schedule.waveform, self.sample_rate)
+        with self._lock:
+            self._schedule = schedule
+
+    def set_tempo(self, tempo):
+        """Change tempo from the next block on; the current bar is stretched or cut."""
+        if tempo <= 0:
+            raise ValueError("Tempo must be positive")
+        with self._lock:
+            self._pending_tempo = float(tempo)
+
+    @property
+    def tempo(self):
+        return self._pending_tempo or self._tempo
+
+    def seek(self, bar):
+        with self._lock:
+            self._bar = bar
+            self._position = 0
+            self.finished = False
+
+    def callback(self, outdata, frames, time=None, status=None):
+        """
+        Fill `outdata` (frames x 2 float32) with the next block.
+
+        Matches sounddevice's OutputStream callback signature. `frames`
+        must not exceed `block_size`.
+        """
+        with self._lock:
+            self._apply_tempo()
+            schedule = self._schedule
+        written = 0
+        while written < frames:
+            if self._position >= self._bar_length:
+                # A faster tempo can leave the position past the end of the
+                # current bar, which then ends here
+                self._bar += 1
+                self._position = 0
+            if self._bar >= len(schedule):
+                if self.loop and len(schedule):
+                    self._bar = 0
+                else:
+                    outdata[written:frames] = 0
+                    self.finished = True
+                    break
+            count = min(frames - written, self._bar_length - self._position)
+            self._render(schedule, outdata[written:written + count], count)
+            written += count
+            self._position += count
+            if self._position >= self._bar_length:
+                self._bar += 1
+                self._position = 0
+        if self.finished and self._stop_exception is not None:
+            raise self._stop_exception
+
+    def render(self, num_frames):
+        """Render `num_frames` frames through the callback, without a sound device."""
+        output = np.zeros((num_frames, CHANNELS), dtype=np.float32)
+        for start in range(0, num_frames, self.block_size):
+            stop = min(start + self.block_size, num_frames)
+            self.callback(output[start:stop], stop - start)
+        return output
+
+    def render_all(self):
+        """Render from the current position to the end of the sequence."""
+        blocks = []
+        while not self.finished:
+            blocks.append(self.render(self.block_size))
+        return np.concatenate(blocks) if blocks else np.zeros((0, CHANNELS), dtype=np.float32)
+
+    def play(self, blocking=True, device=None):
+        """Play through sounddevice, returning when done if `blocking`."""
+        import sounddevice
+
+        self._stop_exception = sounddevice.CallbackStop
+        done = threading.Event()
+        self._stream = sounddevice.OutputStream(
+            samplerate=self.sample_rate,
+            blocksize=self.block_size,
+            channels=CHANNELS,
+            dtype='float32',
+            latency='low',
+            device=device,
+            callback=self.callback,
+            finished_callback=done.set
+        )
+        self._stream.start()
+        if blocking:
+            try:
+                done.wait()
+            finally:
+                self.stop()
+
+    def stop(self):
+        if self._stream is not None:
+            self._stream.close()
+            self._stream = None
+
+    def _apply_tempo(self):
+        # Caller must hold the lock
+        if self._pending_tempo is not None:
+            self._tempo = self._pending_tempo
+            self._pending_tempo = None
+            self._bar_length = max(1, int(4 * 60.0 / self._tempo * self.sample_rate))
+
+    def _render(self, schedule, out, frames):
+        bar = self._bar
+        voices = schedule.voices[bar]
+        if voices == 0:
+            out[:] = 0
+            return
+        size = voices * frames
+        phase = self._phase[:size].reshape(voices, frames)
+        floor = self._floor[:size].reshape(voices, frames)
+        samples = self._samples[:size].reshape(voices, frames)
+
+        # Phase from the bar start, computed as the file renderer does.
+        # Per-voice scalar operations are used wherever a broadcast would
+        # make NumPy allocate a temporary buffer
+        time = self._time[:frames]
+        np.add(self._ramp[:frames], self._position, out=time)
+        increments = schedule.increments[bar]
+        for voice in range(voices):
+            np.multiply(time, increments[voice], out=phase[voice])
+        np.floor(phase, out=floor)
+        phase -= floor
+
+        bases = schedule.bases[bar]
+        if schedule.waveform == 'pwm':
+            # A pulse is the difference of two ramps offset by the duty cycle
+            shifted = self._shifted[:size].reshape(voices, frames)
+            np.subtract(phase, DUTY_CYCLE, out=shifted)
+            np.floor(shifted, out=floor)
+            shifted -= floor
+            self._read(schedule, shifted, bases, samples, floor)
+            other = self._other[:size].reshape(voices, frames)
+            samples -= self._read(schedule, phase, bases, other, floor)
+            samples += 2 * DUTY_CYCLE - 1
+        else:
+            self._read(schedule, phase, bases, samples, floor)
+
+        mix = self._mix[:schedule.synth_channels * frames].reshape(schedule.synth_channels, frames)
+        np.dot(schedule.weights[bar, :, :voices], samples, out=mix)
+        mix *= schedule.gain
+        # Mono mixes broadcast to both output channels
+        np.copyto(out, mix.T, casting='same_kind')
+
+    def _read(self, schedule, position, bases, out, floor):
+        """
+        Interpolated wavetable read into `out`; `position` and `floor` are
+        overwritten.
+        """
+        index = self._index[:position.size].reshape(position.shape)
+        position *= oscillators.TABLE_SIZE
+        np.floor(position, out=floor)
+        position -= floor
+        # Offset each voice to its table in the bank
+        for voice in range(len(position)):
+            floor[voice] += bases[voice]
+        np.copyto(index, floor, casting='unsafe')
+        schedule.slope.take(index, out=out, mode='clip')
+        out *= position
+        schedule.table.take(index, out=position, mode='clip')
+        out += position
+        return out
+
+
+def parse_chord(text):
+    """
+    A chord from space-separated note names or numbers, or None for '-'.
+
+    Notes are placed in octave 0 (C4 to B4), where the app voices chords.
+    """
+    if text.strip() in ('', '-'):
+        return None
+    return [Note(name, 0) for name in text.split()]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('chords', nargs='+', help='chords as quoted note lists, "-" for a rest')
+    parser.add_argument('--tempo', type=float, default=120)
+    parser.add_argument('--waveform', choices=oscillators.WAVEFORMS, default='sine')
+    parser.add_argument('--block-size', type=int, default=256, help='frames per callback')
+    parser.add_argument('--loop', action='store_true')
+    parser.add_argument('--output', help='render to this WAV file instead of the sound device')
+    args = parser.parse_args(argv)
+
+    engine = PlaybackEngine(
+        [parse_chord(chord) for chord in args.chords],
+        tempo=args.tempo,
+        waveform=args.waveform,
+        block_size=args.block_size,
+        loop=args.loop and not args.output
+    )
+    if args.output:
+        audio = engine.render_all()
+        with open(args.output, 'wb') as f:
+            f.write(wav_header(len(audio), engine.sample_rate, CHANNELS))
+            f.write(to_pcm16(audio).tobytes())
+    else:
+        engine.play()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,156 @@
+"""
+Render a corpus of chord sequences to audio files, in parallel.
+
+Each input record uses the /play_sequence payload schema: a `sequence`
+of chords (or null rests), a `tempo` and an optional `waveform`, plus an
+optional `id` that names the output file (the record's line number
+otherwise). Input is JSON Lines, or CSV with `id`, `sequence` (as JSON),
+`tempo` and `waveform` columns.
+
+    python render_batch.py progressions.jsonl out/
+    python render_batch.py progressions.csv out/ --jobs 8 --format flac
+
+Files are written straight to the output directory, through a temporary
+file and a rename, so an interrupted run can be restarted with the same
+command: records whose file already exists are skipped.
+"""
+
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from multiprocessing import Pool
+
+import audio_utils
+from atomic_file import atomic_write
+from audio_cache import bar_cache
+from sequence_service import parse_note_sequence
+
+REPORT_INTERVAL = 5.0  # Seconds between progress lines
+
+
+def read_records(path):
+    """Yield (line number, record) pairs from a JSONL or CSV file."""
+    with open(path, newline='') as f:
+        if path.endswith('.csv'):
+            for number, row in enumerate(csv.DictReader(f), 1):
+                record = dict(row)
+                record['sequence'] = json.loads(row['sequence'])
+                yield number, record
+        else:
+            for number, line in enumerate(f, 1):
+                if line.strip():
+                    yield number, json.loads(line)
+
+
+def output_name(number, record):
+    name = str(record.get('id') or f'{number:06d}')
+    return ''.join(c if c.isalnum() or c in '-_.' else '_' for c in name).lstrip('.')
+
+
+def render_job(job):
+    """
+    Render one record in a worker process.
+
+    Returns (name, status, bytes written, seconds of audio, error), where
+    status is 'rendered', 'empty' or 'failed'.
+    """
+    name, path, record, fmt = job
+    try:
+        tempo = float(record.get('tempo', 120))
+        data = audio_utils.render_sequence_wav(
+            parse_note_sequence(record['sequence']),
+            tempo=tempo,
+            waveform=record.get('waveform') or 'sine',
+            cache=bar_cache,
+            fmt=fmt
+        )
+        if data is None:
+            return name, 'empty', 0, 0.0, None
+        atomic_write(path, lambda f: f.write(data))
+        seconds = 4 * 60.0 / tempo * len(record['sequence'])
+        return name, 'rendered', len(data), seconds, None
+    except Exception as e:
+        return name, 'failed', 0, 0.0, f'{type(e).__name__}: {e}'
+
+
+class Progress:
+    """Running totals and throughput for a batch run."""
+
+    def __init__(self, total):
+        self.total = total
+        self.started = time.monotonic()
+        self.last_report = self.started
+        self.counts = {'rendered': 0, 'skipped': 0, 'empty': 0, 'failed': 0}
+        self.bytes = 0
+        self.audio_seconds = 0.0
+
+    def add(self, status, size=0, seconds=0.0):
+        self.counts[status] += 1
+        self.bytes += size
+        self.audio_seconds += seconds
+
+    def report(self, force=False):
+        now = time.monotonic()
+        if not force and now - self.last_report < REPORT_INTERVAL:
+            return
+        self.last_report = now
+        elapsed = max(now - self.started, 1e-9)
+        done = sum(self.counts.values())
+        counts = ', '.join(f'{count} {status}' for status, count in self.counts.items())
+        print(
+            f'{done}/{self.total} ({counts})  '
+            f'{self.counts["rendered"] / elapsed:.1f} files/s  '
+            f'{self.audio_seconds / elapsed:.1f}x realtime  '
+            f'{self.bytes / elapsed / 1e6:.1f} MB/s  '
+            f'{elapsed:.1f}s elapsed',
+            file=sys.stderr
+        )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('input', help='JSONL or CSV file of sequences')
+    parser.add_argument('output', help='directory for the rendered files')
+    parser.add_argument('--jobs', type=int, default=None, help='worker processes (default: CPU count)')
+    parser.add_argument('--format', choices=audio_utils.OUTPUT_FORMATS, default='wav', help='output format')
+    parser.add_argument('--force', action='store_true', help='re-render files that already exist')
+    parser.add_argument('--errors', help='append failed records to this JSONL file')
+    args = parser.parse_args(argv)
+
+    os.makedirs(args.output, exist_ok=True)
+    jobs = []
+    skipped = 0
+    for number, record in read_records(args.input):
+        name = output_name(number, record)
+        path = os.path.join(args.output, f'{name}.{args.format}')
+        if not args.force and os.path.exists(path):
+            skipped += 1
+            continue
+        jobs.append((name, path, record, args.format))
+
+    progress = Progress(len(jobs) + skipped)
+    progress.counts['skipped'] = skipped
+    errors = open(args.errors, 'a') if args.errors else None
+    try:
+        with Pool(args.jobs) as pool:
+            # Small chunks keep every worker busy while bars repeated within
+            # a chunk still hit that worker's bar cache
+            for name, status, size, seconds, error in pool.imap_unordered(render_job, jobs, chunksize=4):
+                progress.add(status, size, seconds)
+                if error:
+                    print(f'{name}: {error}', file=sys.stderr)
+                    if errors:
+                        errors.write(json.dumps({'id': name, 'error': error}) + '\n')
+                progress.report()
+    finally:
+        if errors:
+            errors.close()
+    progress.report(force=True)
+    return 1 if progress.counts['failed'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
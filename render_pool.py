@@ -0,0 +1,133 @@
+import os
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+
+class RenderTimeout(Exception):
+    """Raised when a request's renders do not finish before its deadline."""
+
+
+class RenderScheduler:
+    """
+    Thread pool for fanning audio renders out across cores.
+
+    NumPy releases the GIL in the heavy array operations, so threads give
+    real parallelism without the pickling cost of a process pool. Each call
+    to `map` keeps at most `window` tasks queued or running at once, so a
+    large request cannot fill the queue ahead of small ones.
+    """
+
+    def __init__(self, max_workers=None, window=2, timeout=10.0):
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.window = window
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='render')
+        self._lock = threading.Lock()
+        self.queued = 0
+        self.active = 0
+        self.completed = 0
+        self.timeouts = 0
+        self.max_queue_depth = 0
+        self.background = 0
+        self.background_errors = 0
+
+    def map(self, fn, items, timeout=None):
+        """
+        Return [fn(item) for item in items], rendered on the pool.
+
+        Raises RenderTimeout if the results are not all ready within
+        `timeout` seconds (the scheduler default if None). A single item is
+        rendered inline on the calling thread.
+        """
+        items = list(items)
+        if len(items) <= 1:
+            return [fn(item) for item in items]
+
+        limit = self.timeout if timeout is None else timeout
+        deadline = time.monotonic() + limit
+        results = [None] * len(items)
+        pending = {}
+        next_index = 0
+        try:
+            while next_index < len(items) or pending:
+                while next_index < len(items) and len(pending) < self.window:
+                    pending[self._submit(fn, items[next_index])] = next_index
+                    next_index += 1
+                remaining = deadline - time.monotonic()
+                done, _ = wait(pending, timeout=max(remaining, 0), return_when=FIRST_COMPLETED)
+                if not done:
+                    with self._lock:
+                        self.timeouts += 1
+                    raise RenderTimeout(f"Render did not finish within {limit}s")
+                for future in done:
+                    results[pending.pop(future)] = future.result()
+        finally:
+            for future in pending:
+                future.cancel()
+        return results
+
+    def submit_background(self, fn, *args):
+        """
+        Run fn(*args) on the pool without waiting for it.
+
+        Used for prefetching; errors are counted rather than raised. `fn`
+        must not itself call `map`, which could wait on tasks queued behind
+        it.
+        """
+        with self._lock:
+            self.background += 1
+        future = self._submit(lambda _: fn(*args), None)
+        future.add_done_callback(self._on_background_done)
+        return future
+
+    def stats(self):
+        with self._lock:
+            return {
+                'max_workers': self.max_workers,
+                'window': self.window,
+                'queue_depth': self.queued,
+                'max_queue_depth': self.max_queue_depth,
+                'active': self.active,
+                'completed': self.completed,
+                'timeouts': self.timeouts,
+                'background': self.background,
+                'background_errors': self.background_errors,
+            }
+
+    def _submit(self, fn, item):
+        with self._lock:
+            self.queued += 1
+            self.max_queue_depth = max(self.max_queue_depth, self.queued)
+        future = self._executor.submit(self._run, fn, item)
+        future.add_done_callback(self._on_done)
+        return future
+
+    def _run(self, fn, item):
+        with self._lock:
+            self.queued -= 1
+            self.active += 1
+        try:
+            return fn(item)
+        finally:
+            with self._lock:
+                self.active -= 1
+                self.completed += 1
+
+    def _on_background_done(self, future):
+        if not future.cancelled() and future.exception() is not None:
+            with self._lock:
+                self.background_errors += 1
+
+    def _on_done(self, future):
+        # Tasks cancelled before they started never reached _run
+        if future.cancelled():
+            with self._lock:
+                self.queued -= 1
+
+
+render_scheduler = RenderScheduler(
+    max_workers=int(os.environ.get('RENDER_WORKERS', 0)) or None,
+    window=int(os.environ.get('RENDER_WINDOW', 2)),
+    timeout=float(os.environ.get('RENDER_TIMEOUT', 10)),
+)
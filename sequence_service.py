@@ -0,0 +1,167 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+
+import audio_utils
+from audio_cache import bar_cache
+from harmonizer import Note
+
+
+def parse_note_sequence(sequence):
+    """Notes of a /play_sequence `sequence` payload; None entries are rests."""
+    return [
+        [Note(note['name'], note['octave']) for note in chord_data['notes']] if chord_data else None
+        for chord_data in sequence
+    ]
+
+
+def sequence_key(note_sequence, tempo, waveform):
+    """
+    Canonical key for a sequence render.
+
+    Bars are mixed as plain sums of their notes, so each bar is reduced to
+    its sorted MIDI numbers; payloads that differ only in note order or in
+    how the tempo is written share one render.
+    """
+    bars = tuple(
+        tuple(sorted(note.get_midi_number() for note in chord)) if chord else None
+        for chord in note_sequence
+    )
+    return (bars, float(tempo), waveform)
+
+
+class _Flight:
+    """A render in progress that other requests can wait on."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SequenceRenderer:
+    """
+    Renders whole sequences for the /play_sequence and /download_sequence
+    JSON responses.
+
+    Identical requests that arrive while a render is running wait for it
+    instead of starting their own (single-flight), and finished renders are
+    kept for `ttl` seconds, so a burst of identical requests costs one
+    render. Finished renders are bounded by total size as well as count.
+    """
+
+    def __init__(self, ttl=30.0, max_entries=64, max_bytes=None, cache=None):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.cache = cache
+        self._results = OrderedDict()
+        self._size = 0
+        self._in_flight = {}
+        self._lock = threading.Lock()
+        self.renders = 0
+        self.hits = 0
+        self.coalesced = 0
+        self.errors = 0
+
+    def render(self, note_sequence, tempo=120, waveform='sine'):
+        """
+        Base64 WAV of the sequence (see audio_utils.concatenate_chord_audio),
+        or None if it has no chords.
+        """
+        key = sequence_key(note_sequence, tempo, waveform)
+        with self._lock:
+            cached = self._lookup(key)
+            if cached is not None:
+                self.hits += 1
+                return cached[0]
+            flight = self._in_flight.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._in_flight[key] = _Flight()
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+
+        try:
+            flight.result = audio_utils.concatenate_chord_audio(
+                note_sequence,
+                tempo=tempo,
+                waveform=waveform,
+                cache=self.cache
+            )
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._in_flight[key]
+                if flight.error is None:
+                    self.renders += 1
+                    self._store(key, flight.result)
+                else:
+                    self.errors += 1
+            flight.done.set()
+        return flight.result
+
+    def clear(self):
+        with self._lock:
+            self._results.clear()
+            self._size = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._results),
+                'max_entries': self.max_entries,
+                'bytes': self._size,
+                'max_bytes': self.max_bytes,
+                'ttl': self.ttl,
+                'in_flight': len(self._in_flight),
+                'renders': self.renders,
+                'hits': self.hits,
+                'coalesced': self.coalesced,
+                'errors': self.errors,
+            }
+
+    def _lookup(self, key):
+        # Caller must hold the lock; returns (result,) so None results cache too
+        entry = self._results.get(key)
+        if entry is None:
+            return None
+        expires, result = entry
+        if expires <= time.monotonic():
+            self._evict(key)
+            return None
+        return (result,)
+
+    def _store(self, key, result):
+        # Caller must hold the lock
+        if self.ttl <= 0:
+            return
+        if key in self._results:
+            self._evict(key)
+        self._results[key] = (time.monotonic() + self.ttl, result)
+        self._size += len(result or '')
+        while self._results and (
+            len(self._results) > self.max_entries
+            or (self.max_bytes is not None and self._size > self.max_bytes)
+        ):
+            self._evict(next(iter(self._results)))
+
+    def _evict(self, key):
+        _, result = self._results.pop(key)
+        self._size -= len(result or '')
+
+
+sequence_renderer = SequenceRenderer(
+    ttl=float(os.environ.get('SEQUENCE_CACHE_TTL', 30)),
+    max_bytes=int(os.environ.get('SEQUENCE_CACHE_MB', 64)) * 1024 * 1024,
+    cache=bar_cache,
+)
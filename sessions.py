@@ -0,0 +1,334 @@
+"""
+Editing sessions for the sequence grid.
+
+A session holds a sequence, its tempo and waveform on the server, so the
+browser sends only what changed (bar 3 now has these notes, the tempo is
+now 100) and gets back the bars that changed. Each bar's audio has its own
+content-addressed URL, so only changed bars are rendered and downloaded;
+unchanged bars stay in the browser's cache.
+
+Sessions are kept in memory, or with a `directory` as small JSON files
+shared by every worker process, the same way as the audio cache's disk
+tier.
+"""
+
+import os
+import json
+import time
+import uuid
+import fcntl
+import threading
+from collections import OrderedDict
+
+import oscillators
+from atomic_file import atomic_write
+from harmonizer import Note, Voicer
+
+MAX_BARS = 256
+# Bar audio is requested by URL, so bar length is bounded through the tempo
+MIN_TEMPO = 20.0
+MAX_TEMPO = 400.0
+
+
+class SessionNotFound(KeyError):
+    """Raised for an unknown or expired session id."""
+
+
+class Session:
+    """
+    State of one editing session.
+
+    Bars are stored as MIDI numbers (None for a rest). `version` counts
+    edits, and `bar_versions[i]` is the version at which bar i last
+    changed, so a client that has seen version v only needs the bars with
+    a later version.
+    """
+
+    def __init__(self, id, bars, tempo=120.0, waveform='sine', version=0, bar_versions=None):
+        self.id = id
+        self.bars = bars
+        self.tempo = tempo
+        self.waveform = waveform
+        self.version = version
+        self.bar_versions = bar_versions or [0] * len(bars)
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(
+            data['id'],
+            [tuple(bar) if bar is not None else None for bar in data['bars']],
+            data['tempo'],
+            data['waveform'],
+            data['version'],
+            list(data['bar_versions'])
+        )
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'bars': [list(bar) if bar is not None else None for bar in self.bars],
+            'tempo': self.tempo,
+            'waveform': self.waveform,
+            'version': self.version,
+            'bar_versions': list(self.bar_versions),
+        }
+
+    def chord(self, index):
+        """Notes of bar `index`, or None for a rest."""
+        bar = self.bars[index]
+        return [Note.from_midi_number(n) for n in bar] if bar is not None else None
+
+    def changed_since(self, version):
+        """Indices of the bars that changed after `version`."""
+        return [i for i, bar_version in enumerate(self.bar_versions) if bar_version > version]
+
+    def apply(self, edits):
+        """
+        Apply a list of edits and return the indices of the changed bars.
+
+        Each edit is one of:
+            {'bar': i, 'notes': [{'name': 'C', 'octave': 0}, ...]}
+            {'bar': i, 'notes': None}          (clear the bar)
+            {'bar': i, 'shift': octaves}       (transpose the bar)
+            {'tempo': bpm}
+            {'waveform': name}
+        Tempo and waveform changes affect every bar. Edits are validated
+        before any is applied, so a bad edit leaves the session unchanged.
+        """
+        bars = list(self.bars)
+        tempo, waveform = self.tempo, self.waveform
+        for edit in edits:
+            if 'tempo' in edit:
+                tempo = _tempo(edit['tempo'])
+            if 'waveform' in edit:
+                waveform = oscillators.check_waveform(edit['waveform'])
+            if 'bar' not in edit:
+                continue
+            index = int(edit['bar'])
+            if not 0 <= index < MAX_BARS:
+                raise ValueError(f"Bar must be between 0 and {MAX_BARS - 1}")
+            if index >= len(bars):
+                bars.extend([None] * (index + 1 - len(bars)))
+            if 'notes' in edit:
+                bars[index] = _midi_numbers(edit['notes'])
+            if edit.get('shift') and bars[index] is not None:
+                chord = [Note.from_midi_number(n) for n in bars[index]]
+                bars[index] = _midi_numbers(Voicer.shift_octave(chord, int(edit['shift'])))
+
+        if tempo != self.tempo or waveform != self.waveform:
+            changed = list(range(len(bars)))
+        else:
+            changed = [i for i, bar in enumerate(bars) if i >= len(self.bars) or bar != self.bars[i]]
+        if not changed:
+            return []
+
+        self.version += 1
+        self.bar_versions.extend([0] * (len(bars) - len(self.bars)))
+        for index in changed:
+            self.bar_versions[index] = self.version
+        self.bars, self.tempo, self.waveform = bars, tempo, waveform
+        return changed
+
+
+def _tempo(value):
+    tempo = float(value)
+    if not MIN_TEMPO <= tempo <= MAX_TEMPO:
+        raise ValueError(f"Tempo must be between {MIN_TEMPO:g} and {MAX_TEMPO:g} BPM")
+    return tempo
+
+
+def _midi_numbers(notes):
+    """MIDI numbers of a chord given as Notes or note dicts, or None."""
+    if not notes:
+        return None
+    if len(notes) > oscillators.MAX_CHORD_SIZE:
+        raise ValueError(f"Chords can have at most {oscillators.MAX_CHORD_SIZE} notes")
+    if isinstance(notes[0], dict):
+        notes = [Note(note['name'], note['octave']) for note in notes]
+    numbers = tuple(note.get_midi_number() for note in notes)
+    if any(abs(n) > 127 for n in numbers):
+        raise ValueError("Notes must be within 127 semitones of C0")
+    return numbers
+
+
+class SessionStore:
+    """
+    Sessions by id, expiring `ttl` seconds after their last use.
+
+    In memory the store keeps at most `max_sessions`, dropping the least
+    recently used. With a `directory`, every read and edit goes to disk so
+    all workers see the same state; edits to one session are serialized by
+    a lock file.
+    """
+
+    def __init__(self, ttl=3600.0, max_sessions=1024, directory=None):
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self.directory = directory
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+        self._edit_lock = threading.Lock()
+        self._last_sweep = time.monotonic()
+        self.created = 0
+        self.edits = 0
+        self.expired = 0
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def create(self, note_sequence, tempo=120.0, waveform='sine'):
+        """Start a session for a sequence of Note lists (None for rests)."""
+        if len(note_sequence) > MAX_BARS:
+            raise ValueError(f"Sequences can have at most {MAX_BARS} bars")
+        session = Session(
+            uuid.uuid4().hex,
+            [_midi_numbers(chord) for chord in note_sequence],
+            _tempo(tempo),
+            oscillators.check_waveform(waveform)
+        )
+        with self._lock:
+            self.created += 1
+        self._save(session)
+        self._sweep()
+        return session
+
+    def get(self, session_id):
+        """The session with `session_id`; raises SessionNotFound."""
+        if self.directory:
+            return self._read(session_id)
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            if entry is None or entry[0] <= time.monotonic():
+                if entry is not None:
+                    del self._sessions[session_id]
+                    self.expired += 1
+                raise SessionNotFound(session_id)
+            self._sessions.move_to_end(session_id)
+            self._sessions[session_id] = (time.monotonic() + self.ttl, entry[1])
+            return Session.from_dict(entry[1])
+
+    def edit(self, session_id, edits):
+        """Apply edits to a session, returning (session, changed bar indices)."""
+        with self._session_lock(session_id):
+            session = self.get(session_id)
+            changed = session.apply(edits)
+            if changed:
+                self._save(session)
+        with self._lock:
+            self.edits += 1
+        return session, changed
+
+    def clear(self):
+        with self._lock:
+            self._sessions.clear()
+
+    def stats(self):
+        files = len(self._files()) if self.directory else None
+        with self._lock:
+            return {
+                'sessions': len(self._sessions) if files is None else files,
+                'max_sessions': self.max_sessions,
+                'ttl': self.ttl,
+                'created': self.created,
+                'edits': self.edits,
+                'expired': self.expired,
+                'disk_enabled': bool(self.directory),
+            }
+
+    def _save(self, session):
+        data = session.to_dict()
+        if not self.directory:
+            with self._lock:
+                self._sessions[session.id] = (time.monotonic() + self.ttl, data)
+                self._sessions.move_to_end(session.id)
+                while len(self._sessions) > self.max_sessions:
+                    self._sessions.popitem(last=False)
+                    self.expired += 1
+            return
+        # Other workers never read a partially written session
+        atomic_write(self._path(session.id), lambda f: json.dump(data, f), mode='w')
+
+    def _read(self, session_id):
+        path = self._path(session_id)
+        try:
+            with open(path) as f:
+                data = json.load(f)
+            expired = os.path.getmtime(path) + self.ttl <= time.time()
+            if not expired:
+                # Reading a session counts as using it
+                os.utime(path)
+        except (OSError, ValueError):
+            raise SessionNotFound(session_id)
+        if expired:
+            self._remove(session_id)
+            with self._lock:
+                self.expired += 1
+            raise SessionNotFound(session_id)
+        return Session.from_dict(data)
+
+    def _session_lock(self, session_id):
+        # In memory, one lock serializes edits to every session
+        if not self.directory:
+            return self._edit_lock
+        return _FileLock(self._path(session_id) + '.lock')
+
+    def _path(self, session_id):
+        if not session_id.isalnum():
+            raise SessionNotFound(session_id)
+        return os.path.join(self.directory, session_id + '.json')
+
+    def _files(self):
+        try:
+            return [name for name in os.listdir(self.directory) if name.endswith('.json')]
+        except OSError:
+            return []
+
+    def _remove(self, session_id):
+        for path in (self._path(session_id), self._path(session_id) + '.lock'):
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+
+    def _sweep(self):
+        """Delete expired session files, at most every tenth of the TTL."""
+        if not self.directory:
+            return
+        with self._lock:
+            now = time.monotonic()
+            if now - self._last_sweep < self.ttl / 10:
+                return
+            self._last_sweep = now
+        cutoff = time.time() - self.ttl
+        for name in self._files():
+            session_id = name[:-len('.json')]
+            try:
+                if os.path.getmtime(os.path.join(self.directory, name)) < cutoff:
+                    self._remove(session_id)
+                    with self._lock:
+                        self.expired += 1
+            except OSError:
+                pass
+
+
+class _FileLock:
+    """Exclusive advisory lock on a file, shared between processes."""
+
+    def __init__(self, path):
+        self.path = path
+        self._file = None
+
+    def __enter__(self):
+        self._file = open(self.path, 'a')
+        fcntl.flock(self._file, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        fcntl.flock(self._file, fcntl.LOCK_UN)
+        self._file.close()
+        self._file = None
+
+
+session_store = SessionStore(
+    ttl=float(os.environ.get('SESSION_TTL', 3600)),
+    directory=os.environ.get('SESSION_DIR') or None,
+)
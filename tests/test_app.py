@@ -0,0 +1,94 @@
+import app
+import audio_utils
+from audio_cache import chord_cache, chord_key
+from harmonizer import Harmonizer
+
+
+def test_harmonize_and_single_renders_cache_the_same_bytes():
+    chord_cache.clear()
+    voicings = [voicing for chord_set in Harmonizer(['C', 'E', 'G', 'B']).harmonize(3) for _, voicing in chord_set]
+    for waveform in ('sine', 'pwm'):
+        app.generate_audio_batch(voicings, 44100, waveform, 'wav')
+        for voicing in voicings:
+            key = chord_key(voicing, waveform, 44100) + ('wav',)
+            assert chord_cache.get(key) == audio_utils.generate_chord_wav(voicing, 44100, waveform)
+
+
+def test_audio_etag_comes_from_the_content_key():
+    client = app.app.test_client()
+    chord_cache.clear()
+    first = client.get('/audio/sine/0_4_7.wav?rate=44100')
+    chord_cache.clear()
+    second = client.get('/audio/sine/0_4_7.wav?rate=44100')
+    assert first.status_code == second.status_code == 200
+    assert first.headers['ETag'] == second.headers['ETag']
+    assert first.get_data() == second.get_data()
+
+    # A client that has the audio gets a 304 without it being rendered
+    chord_cache.clear()
+    misses = chord_cache.stats()['misses']
+    cached = client.get('/audio/sine/0_4_7.wav?rate=44100', headers={'If-None-Match': first.headers['ETag']})
+    assert cached.status_code == 304
+    assert chord_cache.stats()['misses'] == misses
+
+
+def test_bar_etag_depends_on_tempo_and_format():
+    client = app.app.test_client()
+    etags = {
+        client.get(f'/bars/sine/0_4_7.{fmt}?tempo={tempo}').headers['ETag']
+        for fmt in ('wav', 'flac') for tempo in (100, 120)
+    }
+    assert len(etags) == 4
+    response = client.get('/bars/pwm/0_4_7.wav?tempo=120')
+    again = client.get('/bars/pwm/0_4_7.wav?tempo=120', headers={'If-None-Match': response.headers['ETag']})
+    assert again.status_code == 304
+
+
+SEQUENCE = [{'notes': [{'name': 'C', 'octave': 0}, {'name': 'E', 'octave': 0}, {'name': 'G', 'octave': 0}]}, None]
+
+
+def test_streamed_sequence_is_a_whole_wav():
+    client = app.app.test_client()
+    response = client.post('/play_sequence', json={'sequence': SEQUENCE, 'tempo': 120, 'stream': True})
+    assert response.status_code == 200
+    data = response.get_data()
+    assert data[:4] == b'RIFF'
+    assert len(data) == 44 + 2 * 2 * 44100 * 2
+
+
+def test_bad_sequence_payloads_are_rejected_before_rendering():
+    client = app.app.test_client()
+    payloads = [
+        {'sequence': SEQUENCE, 'tempo': 0.001},
+        {'sequence': SEQUENCE, 'tempo': 'nan'},
+        {'sequence': SEQUENCE, 'tempo': 1000},
+        {'sequence': SEQUENCE * 200, 'tempo': 120},
+        {'sequence': SEQUENCE, 'tempo': 120, 'waveform': 'noise'},
+        {'sequence': SEQUENCE},
+        {'tempo': 120},
+        {'sequence': SEQUENCE, 'tempo': None},
+    ]
+    for payload in payloads:
+        for stream in (True, False):
+            for route in ('/play_sequence', '/download_sequence'):
+                response = client.post(route, json=dict(payload, stream=stream))
+                assert response.status_code == 400, (route, payload)
+                assert response.get_json()['success'] is False
+
+
+def test_shift_octave_rejects_bad_options_as_400():
+    client = app.app.test_client()
+    notes = SEQUENCE[0]['notes']
+    response = client.post('/shift_octave', json={'notes': notes, 'shift': 1})
+    assert response.status_code == 200
+    assert [note['octave'] for note in response.get_json()['notes']] == [1, 1, 1]
+    for payload in (
+        {'notes': notes, 'shift': 1, 'format': 'mp3'},
+        {'notes': notes, 'shift': 1, 'sample_rate': 'fast'},
+        {'notes': notes, 'shift': 1, 'waveform': 'noise'},
+        {'notes': notes},
+        {'shift': 1},
+    ):
+        response = client.post('/shift_octave', json=payload)
+        assert response.status_code == 400, payload
+        assert response.get_json()['success'] is False
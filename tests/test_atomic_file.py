@@ -0,0 +1,29 @@
+import os
+
+import pytest
+
+from atomic_file import atomic_write
+
+
+def test_atomic_write_replaces_the_file(tmp_path):
+    path = str(tmp_path / 'data.bin')
+    atomic_write(path, lambda f: f.write(b'first'))
+    atomic_write(path, lambda f: f.write(b'second'))
+    with open(path, 'rb') as f:
+        assert f.read() == b'second'
+    assert os.listdir(tmp_path) == ['data.bin']
+
+
+def test_failed_write_keeps_the_old_file(tmp_path):
+    path = str(tmp_path / 'data.txt')
+    atomic_write(path, lambda f: f.write('old'), mode='w')
+
+    def fail(f):
+        f.write('partial')
+        raise TypeError('not serializable')
+
+    with pytest.raises(TypeError):
+        atomic_write(path, fail, mode='w')
+    with open(path) as f:
+        assert f.read() == 'old'
+    assert os.listdir(tmp_path) == ['data.txt']
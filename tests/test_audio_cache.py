@@ -0,0 +1,70 @@
+import os
+
+from audio_cache import AudioCache, chord_key, key_digest
+from harmonizer import Note
+
+
+def test_rejects_entries_over_the_byte_budget():
+    cache = AudioCache(max_bytes=1000)
+    cache.put('small', b'x' * 500)
+    cache.put('large', b'y' * 2000)
+    assert cache.get('small') is not None
+    assert cache.get('large') is None
+    assert cache.stats()['bytes'] == 500
+    assert cache.stats()['rejected'] == 1
+
+
+def test_evicts_least_recently_used_first():
+    cache = AudioCache(max_entries=2)
+    cache.put('a', b'1')
+    cache.put('b', b'2')
+    cache.get('a')
+    cache.put('c', b'3')
+    assert cache.get('b') is None
+    assert cache.get('a') == b'1'
+    assert cache.get('c') == b'3'
+    assert cache.stats()['evictions'] == 1
+
+
+def test_stays_within_the_byte_budget():
+    cache = AudioCache(max_entries=100, max_bytes=1000)
+    for i in range(10):
+        cache.put(i, bytes(300))
+        assert cache.stats()['bytes'] <= 1000
+    assert cache.stats()['entries'] == 3
+    assert [cache.get(i) is not None for i in (6, 7, 8, 9)] == [False, True, True, True]
+
+
+def test_disk_tier_is_shared_between_instances(tmp_path):
+    first = AudioCache(directory=str(tmp_path))
+    second = AudioCache(directory=str(tmp_path))
+    assert second.get('key') is None
+    first.put('key', b'audio')
+    assert second.get('key') == b'audio'
+    assert second.stats()['disk_hits'] == 1
+    assert second.stats()['misses'] == 1
+    # No temporary files are left behind
+    assert [path.suffix for path in tmp_path.iterdir()] == ['.bin']
+
+
+def test_disk_tier_trims_oldest_files_to_90_percent(tmp_path):
+    cache = AudioCache(max_entries=1, directory=str(tmp_path), max_disk_bytes=10000)
+    for i in range(10):
+        cache.put(i, bytes(1000))
+        # Age the files so their order is clear from modification times
+        os.utime(cache._path(i), (i, i))
+    cache.get(0)  # Reading an entry marks it used
+    cache.put(10, bytes(1000))
+    names = {path.name for path in tmp_path.iterdir()}
+    assert sum(path.stat().st_size for path in tmp_path.iterdir()) <= 9000
+    assert os.path.basename(cache._path(0)) in names
+    assert os.path.basename(cache._path(10)) in names
+    assert os.path.basename(cache._path(1)) not in names
+    assert cache.stats()['disk_evictions'] == 2
+
+
+def test_chord_key_ignores_note_order():
+    assert chord_key([Note('G', 0), Note('C', 0), Note('E', 0)]) == chord_key([Note('C', 0), Note('E', 0), Note('G', 0)])
+    assert chord_key([Note('C', 0)], 'sine') != chord_key([Note('C', 0)], 'pwm')
+    assert chord_key([Note('C', 0)], duration=1) == chord_key([Note('C', 0)], duration=1.0)
+    assert key_digest(chord_key([Note('C', 0)])) == key_digest(chord_key([Note('C', 0)]))
@@ -0,0 +1,55 @@
+import os
+import struct
+
+import numpy as np
+
+import flac
+from audio_utils import render_sequence_wav
+from harmonizer import Note
+
+
+def bitwise_crc(data, poly, width):
+    top = 1 << (width - 1)
+    mask = (1 << width) - 1
+    crc = 0
+    for byte in data:
+        crc ^= byte << (width - 8)
+        for _ in range(8):
+            crc = ((crc << 1) ^ poly) & mask if crc & top else (crc << 1) & mask
+    return crc
+
+
+def test_crc_check_values():
+    assert flac._crc8(b'123456789') == 0xF4
+    assert flac._crc16(b'123456789') == 0xFEE8
+
+
+def test_crc_matches_bitwise_reference():
+    for length in (0, 1, 255, 256, 257, 5000, 70000):
+        data = os.urandom(length)
+        assert flac._crc8(data) == bitwise_crc(data, 0x07, 8)
+        assert flac._crc16(data) == bitwise_crc(data, 0x8005, 16)
+
+
+def test_frames_carry_valid_crcs():
+    samples = (np.sin(np.arange(10000) * 0.05) * 20000).astype(np.int16)
+    data = flac.encode(np.column_stack((samples, samples // 2)), 44100)
+    frames = data[4 + 4 + 34:].split(b'\xff\xf8')[1:]
+    assert len(frames) == 3
+    for frame in frames:
+        frame = b'\xff\xf8' + frame
+        header_size = 2 + 2 + 1 + 2  # Sync, codes, frame number, block size
+        assert flac._crc8(frame[:header_size]) == frame[header_size]
+        # A frame followed by its own CRC-16 has a CRC of zero
+        assert flac._crc16(frame) == 0
+
+
+def test_flac_is_smaller_than_wav():
+    sequence = [[Note('C', 0), Note('E', 0), Note('G', 0)], None, [Note('F', 0), Note('A', 0), Note('C', 1)]] * 4
+    for waveform in ('sine', 'sawtooth', 'pwm'):
+        wav = render_sequence_wav(sequence, tempo=240, waveform=waveform)
+        encoded = render_sequence_wav(sequence, tempo=240, waveform=waveform, fmt='flac')
+        assert encoded[:4] == b'fLaC'
+        (total,) = struct.unpack('>Q', encoded[4 + 4 + 10:4 + 4 + 18])
+        assert total & ((1 << 36) - 1) == (len(wav) - 44) // (4 if waveform == 'pwm' else 2)
+        assert len(encoded) < 0.9 * len(wav)
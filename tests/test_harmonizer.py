@@ -0,0 +1,140 @@
+import itertools
+import random
+
+import numpy as np
+
+from harmonizer import ArrayVoicer, Harmonizer, Note, Voicer
+
+# ArrayVoicer method and the Voicer method it must match
+VOICINGS = [
+    ('close_position', Voicer.close_position),
+    ('drop_2', Voicer.drop_2),
+    ('drop_top', Voicer.drop_top),
+    ('raise_bottom', Voicer.raise_bottom),
+    ('minimal_intervals', Voicer.minimal_intervals),
+    ('spread', Voicer.spread),
+]
+
+
+def pitch_class_chords():
+    """Every chord of 2 or 3 pitch classes, repeats included, and random larger ones."""
+    rng = random.Random(0)
+    for size in (2, 3):
+        yield np.array(list(itertools.product(range(12), repeat=size)))
+    for size in range(4, 9):
+        yield np.array([[rng.randrange(12) for _ in range(size)] for _ in range(300)])
+
+
+def midi(notes):
+    return [note.get_midi_number() for note in notes]
+
+
+def test_array_voicer_matches_voicer():
+    for chords in pitch_class_chords():
+        for name, voice in VOICINGS:
+            voiced = getattr(ArrayVoicer, name)(chords)
+            for row, chord in zip(voiced.tolist(), chords.tolist()):
+                assert row == midi(voice([Note(pc, 4) for pc in chord])), (name, chord)
+
+
+def test_voice_all_matches_the_individual_voicings():
+    for chords in pitch_class_chords():
+        for (name, voiced), method in zip(ArrayVoicer.voice_all(chords), VOICINGS):
+            assert np.array_equal(voiced, getattr(ArrayVoicer, method[0])(chords)), name
+
+
+def test_harmonize_returns_the_voicer_voicings():
+    notes = ['G', 'E', 'C', 'A', 'F#', 'D', 'B']
+    for chord_size in (2, 3, 4, 5):
+        chord_sets = Harmonizer(notes).harmonize(chord_size)
+        for i, chord_set in enumerate(chord_sets):
+            chord = [Note(notes[(i + 2 * k) % len(notes)]) for k in range(chord_size)]
+            assert [name for name, _ in chord_set] == list(ArrayVoicer.NAMES)
+            for (_, voicing), (_, voice) in zip(chord_set, VOICINGS):
+                assert midi(voicing) == midi(voice(chord))
+
+
+def optimal_cost(voicing, cost, previous):
+    """Cost of a voicing (MIDI numbers) as Voicer.optimal defines it."""
+    intervals = sum(abs(b - a) for a, b in zip(voicing, voicing[1:]))
+    if cost == 'intervals':
+        return intervals
+    if cost == 'span':
+        return max(voicing) - min(voicing)
+    if len(previous) == len(voicing):
+        movement = sum(abs(m - p) for m, p in zip(voicing, previous))
+    else:
+        movement = sum(min(abs(m - p) for p in previous) for m in voicing)
+    return movement if cost == 'voice_leading' else intervals + movement
+
+
+def test_optimal_voicing_matches_brute_force():
+    rng = random.Random(1)
+    for _ in range(150):
+        chord = [Note(rng.randrange(12), 4) for _ in range(rng.randint(2, 5))]
+        previous = [Note.from_midi_number(rng.randrange(-12, 24)) for _ in range(rng.randint(2, 5))]
+        octave_range = rng.choice([(-1, 1), (0, 2), (-2, 1)])
+        fix_root = rng.random() < 0.5
+        for cost in ('intervals', 'span', 'voice_leading', 'smooth'):
+            voiced = Voicer.optimal(chord, cost, octave_range, previous, fix_root)
+            octaves = range(octave_range[0], octave_range[1] + 1)
+            options = [[0] if fix_root and i == 0 else octaves for i in range(len(chord))]
+            best = min(
+                optimal_cost([note.number + 12 * o for note, o in zip(chord, combo)], cost, midi(previous))
+                for combo in itertools.product(*options)
+            )
+            assert [note.number for note in voiced] == [note.number for note in chord]
+            assert all(note.octave in octaves for note in voiced)
+            if fix_root:
+                assert voiced[0].octave == 0
+            assert optimal_cost(midi(voiced), cost, midi(previous)) == best, (chord, cost)
+
+
+def movement(previous, current):
+    if len(previous) == len(current):
+        return sum(abs(a - b) for a, b in zip(previous, current))
+    return sum(min(abs(m - p) for p in previous) for m in current)
+
+
+def voice_lead_candidates(chord, octave_range):
+    """The given voicing and every preset voicing, in every octave of the range."""
+    pitch_classes = np.array([[note.number for note in chord]])
+    voicings = [midi(chord)] + [voiced[0].tolist() for _, voiced in ArrayVoicer.voice_all(pitch_classes)]
+    return {
+        tuple(m + 12 * octave for m in voicing)
+        for voicing in voicings for octave in range(octave_range[0], octave_range[1] + 1)
+    }
+
+
+def test_voice_lead_matches_brute_force():
+    rng = random.Random(2)
+    for _ in range(25):
+        sequence = [
+            [Note.from_midi_number(rng.randrange(-6, 18)) for _ in range(rng.randint(2, 4))]
+            for _ in range(3)
+        ]
+        sequence.insert(rng.randrange(4), None)
+        octave_range = rng.choice([(-1, 1), (0, 1)])
+        voiced, total = Harmonizer.voice_lead(sequence, octave_range)
+
+        chords = [chord for chord in sequence if chord]
+        candidates = [voice_lead_candidates(chord, octave_range) for chord in chords]
+        best = min(
+            sum(movement(a, b) for a, b in zip(path, path[1:]))
+            for path in itertools.product(*candidates)
+        )
+        assert total == best
+
+        # The returned voicings are candidates, rests stay put, and their
+        # movement is the reported total
+        assert [chord is None for chord in voiced] == [chord is None for chord in sequence]
+        path = [tuple(midi(chord)) for chord in voiced if chord]
+        assert all(voicing in options for voicing, options in zip(path, candidates))
+        assert sum(movement(a, b) for a, b in zip(path, path[1:])) == total
+
+
+def test_voice_lead_keeps_empty_sequences():
+    assert Harmonizer.voice_lead([None, None]) == ([None, None], 0)
+    chord = [Note('C', 0), Note('E', 0), Note('G', 0)]
+    voiced, total = Harmonizer.voice_lead([chord])
+    assert total == 0 and len(voiced[0]) == 3
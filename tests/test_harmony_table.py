@@ -0,0 +1,50 @@
+import itertools
+import random
+
+import numpy as np
+
+from harmonizer import Harmonizer
+from harmony_table import HarmonyTable, _offsets, build
+
+NOTE_NAMES = ['C', 'C#', 'D', 'D#', 'E', 'F', 'F#', 'G', 'G#', 'A', 'A#', 'B']
+
+
+def test_lookup_matches_computed_voicings():
+    table = HarmonyTable(build())
+    # Every set of up to 5 pitch classes, and a sample of larger ones
+    sets = [s for size in range(2, 6) for s in itertools.combinations(range(12), size)]
+    rng = random.Random(0)
+    sets += [tuple(sorted(rng.sample(range(12), size))) for size in range(6, 13) for _ in range(3)]
+    for pitch_classes in sets:
+        harmonizer = Harmonizer([NOTE_NAMES[pc] for pc in pitch_classes])
+        for chord_size in range(2, len(pitch_classes) + 1):
+            computed = [
+                [[note.get_midi_number() for note in voicing] for _, voicing in chord_set]
+                for chord_set in harmonizer.harmonize(chord_size)
+            ]
+            assert table.lookup(list(pitch_classes), chord_size).tolist() == computed, (pitch_classes, chord_size)
+
+
+def test_lookup_falls_back_for_other_inputs():
+    table = HarmonyTable(build())
+    assert table.lookup([4, 0, 7], 3) is None
+    assert table.lookup([0, 0, 7], 2) is None
+    assert table.lookup([0, 4, 7], 4) is None
+
+
+def test_open_rebuilds_invalid_tables(tmp_path):
+    path = str(tmp_path / 'table.npy')
+    table = HarmonyTable.open(path)
+    _, total = _offsets()
+    assert table.table.shape == (total,)
+
+    for bad in (np.zeros(10, dtype=np.int16), np.zeros(total, dtype=np.int32)):
+        HarmonyTable.save(bad, path)
+        assert np.array_equal(HarmonyTable.open(path).table, table.table)
+
+    # A file cut off mid-write
+    with open(path, 'rb') as f:
+        data = f.read()
+    with open(path, 'wb') as f:
+        f.write(data[:len(data) // 2])
+    assert np.array_equal(HarmonyTable.open(path).table, table.table)
@@ -0,0 +1,48 @@
+import numpy as np
+
+from harmonizer import Note
+from playback import PlaybackEngine, parse_chord
+
+C_MAJOR = [Note('C', 0), Note('E', 0), Note('G', 0)]
+F_MAJOR = [Note('F', 0), Note('A', 0), Note('C', 1)]
+
+
+def test_tempo_raised_mid_bar_ends_the_bar():
+    engine = PlaybackEngine([C_MAJOR, F_MAJOR, C_MAJOR], tempo=60)
+    # 80000 frames into a 176400-frame bar, past the end of a bar at 200 BPM
+    engine.render(80000)
+    engine.set_tempo(200)
+    block = engine.render(256)
+    assert block.shape == (256, 2)
+    assert np.abs(block).max() > 0
+    assert engine._bar == 1
+    assert engine._position == 256
+
+    # The next bar plays from its start at the new tempo
+    reference = PlaybackEngine([F_MAJOR], tempo=200)
+    assert np.allclose(block, reference.render(256))
+
+
+def test_tempo_lowered_mid_bar_stretches_the_bar():
+    engine = PlaybackEngine([C_MAJOR, F_MAJOR], tempo=200)
+    engine.render(20000)
+    engine.set_tempo(60)
+    engine.render(100000)
+    assert engine._bar == 0
+    assert engine._position == 120000
+
+
+def test_plays_to_the_end_after_tempo_changes():
+    engine = PlaybackEngine([C_MAJOR, None, F_MAJOR], tempo=100, block_size=512)
+    for tempo in (300, 40, 400):
+        engine.render(30000)
+        engine.set_tempo(tempo)
+    audio = engine.render_all()
+    assert engine.finished
+    assert np.isfinite(audio).all()
+
+
+def test_parse_chord_uses_the_app_octave():
+    chord = parse_chord('C E G')
+    assert [round(note.frequency, 2) for note in chord] == [261.63, 329.63, 392.0]
+    assert parse_chord('-') is None
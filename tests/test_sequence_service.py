@@ -0,0 +1,70 @@
+import threading
+import time
+
+import app
+import audio_utils
+from sequence_service import SequenceRenderer, parse_note_sequence, sequence_key
+
+SEQUENCE = [{'notes': [{'name': 'C', 'octave': 0}, {'name': 'E', 'octave': 0}, {'name': 'G', 'octave': 0}]}, None]
+
+
+def slow_render(monkeypatch, calls):
+    render = audio_utils.concatenate_chord_audio
+
+    def counted(*args, **kwargs):
+        calls.append(args)
+        time.sleep(0.2)
+        return render(*args, **kwargs)
+
+    monkeypatch.setattr(audio_utils, 'concatenate_chord_audio', counted)
+
+
+def test_identical_concurrent_renders_share_one(monkeypatch):
+    calls = []
+    slow_render(monkeypatch, calls)
+    renderer = SequenceRenderer(ttl=0)
+    note_sequence = parse_note_sequence(SEQUENCE)
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(renderer.render(note_sequence, tempo=120)))
+        for _ in range(8)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1
+    assert len(results) == 8 and len(set(results)) == 1
+    assert renderer.stats()['coalesced'] == 7
+
+    # Nothing is kept with ttl=0, so a later request renders again
+    renderer.render(note_sequence, tempo=120)
+    assert len(calls) == 2
+
+
+def test_concurrent_sequence_requests_share_one_render(monkeypatch):
+    calls = []
+    slow_render(monkeypatch, calls)
+    app.sequence_renderer.clear()
+    payload = {'sequence': SEQUENCE, 'tempo': 97, 'waveform': 'sine'}
+    responses = []
+
+    def post(route):
+        responses.append(app.app.test_client().post(route, json=payload).get_json())
+
+    threads = [threading.Thread(target=post, args=(route,)) for route in ('/play_sequence', '/download_sequence') * 3]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1
+    assert all(response['success'] for response in responses)
+    assert len({response['audio'] for response in responses}) == 1
+
+
+def test_sequence_key_ignores_note_order_and_tempo_spelling():
+    reordered = [{'notes': list(reversed(SEQUENCE[0]['notes']))}, None]
+    assert sequence_key(parse_note_sequence(SEQUENCE), 120, 'sine') == sequence_key(parse_note_sequence(reordered), 120.0, 'sine')
+    assert sequence_key(parse_note_sequence(SEQUENCE), 120, 'sine') != sequence_key(parse_note_sequence(SEQUENCE), 121, 'sine')
@@ -0,0 +1,140 @@
+import threading
+
+import pytest
+
+from harmonizer import Note
+from sessions import MAX_BARS, Session, SessionNotFound, SessionStore
+
+C_MAJOR = [{'name': 'C', 'octave': 0}, {'name': 'E', 'octave': 0}, {'name': 'G', 'octave': 0}]
+
+
+def new_session():
+    return Session('s', [(0, 4, 7), None, (2, 5, 9)])
+
+
+def test_apply_changes_only_edited_bars():
+    session = new_session()
+    assert session.apply([{'bar': 1, 'notes': C_MAJOR}]) == [1]
+    assert session.bars[1] == (0, 4, 7)
+    assert session.apply([{'bar': 0, 'shift': 1}]) == [0]
+    assert session.bars[0] == (12, 16, 19)
+    assert session.apply([{'bar': 2, 'notes': None}]) == [2]
+    assert session.bars[2] is None
+    # Edits that change nothing do not bump the version
+    assert session.apply([{'bar': 1, 'notes': C_MAJOR}]) == []
+    assert session.version == 3
+
+
+def test_tempo_and_waveform_change_every_bar():
+    session = new_session()
+    assert session.apply([{'tempo': 90}]) == [0, 1, 2]
+    assert session.apply([{'waveform': 'pwm'}]) == [0, 1, 2]
+    assert (session.tempo, session.waveform) == (90.0, 'pwm')
+
+
+def test_editing_past_the_end_extends_the_sequence():
+    session = new_session()
+    assert session.apply([{'bar': 5, 'notes': C_MAJOR}]) == [3, 4, 5]
+    assert session.bars[3:] == [None, None, (0, 4, 7)]
+    assert len(session.bar_versions) == 6
+
+
+def test_versions_track_which_bars_changed():
+    session = new_session()
+    session.apply([{'bar': 0, 'shift': 1}])
+    session.apply([{'bar': 2, 'shift': -1}])
+    assert session.version == 2
+    assert session.changed_since(0) == [0, 2]
+    assert session.changed_since(1) == [2]
+    assert session.changed_since(2) == []
+
+
+@pytest.mark.parametrize('edit', [
+    {'tempo': 5},
+    {'tempo': 'nan'},
+    {'waveform': 'noise'},
+    {'bar': MAX_BARS, 'notes': C_MAJOR},
+    {'bar': -1, 'notes': C_MAJOR},
+    {'bar': 0, 'notes': C_MAJOR * 5},
+])
+def test_a_bad_edit_leaves_the_session_unchanged(edit):
+    session = new_session()
+    with pytest.raises(ValueError):
+        session.apply([{'bar': 1, 'notes': C_MAJOR}, edit])
+    assert session.bars == new_session().bars
+    assert session.version == 0
+
+
+def test_sessions_round_trip_through_dicts():
+    session = new_session()
+    session.apply([{'bar': 1, 'notes': C_MAJOR}, {'tempo': 100}])
+    copy = Session.from_dict(session.to_dict())
+    assert copy.to_dict() == session.to_dict()
+    assert copy.chord(1) == [Note('C', 0), Note('E', 0), Note('G', 0)]
+
+
+def test_create_validates_the_sequence():
+    store = SessionStore()
+    with pytest.raises(ValueError):
+        store.create([None] * (MAX_BARS + 1))
+    with pytest.raises(ValueError):
+        store.create([None], tempo=1000)
+    with pytest.raises(SessionNotFound):
+        store.get('missing')
+
+
+def test_memory_store_keeps_the_most_recent_sessions():
+    store = SessionStore(max_sessions=2)
+    first, second = store.create([None]), store.create([None])
+    store.get(first.id)
+    third = store.create([None])
+    with pytest.raises(SessionNotFound):
+        store.get(second.id)
+    assert {store.get(first.id).id, store.get(third.id).id} == {first.id, third.id}
+
+
+def test_memory_store_expires_sessions():
+    store = SessionStore(ttl=0)
+    session = store.create([None])
+    with pytest.raises(SessionNotFound):
+        store.get(session.id)
+
+
+def test_directory_store_is_shared_between_instances(tmp_path):
+    first, second = SessionStore(directory=str(tmp_path)), SessionStore(directory=str(tmp_path))
+    session = first.create([None, None])
+    edited, changed = second.edit(session.id, [{'bar': 1, 'notes': C_MAJOR}])
+    assert changed == [1]
+    assert first.get(session.id).to_dict() == edited.to_dict()
+    assert first.stats()['sessions'] == 1
+    with pytest.raises(SessionNotFound):
+        first.get('../' + session.id)
+
+
+def test_directory_store_expires_sessions(tmp_path):
+    store = SessionStore(ttl=0, directory=str(tmp_path))
+    session = store.create([None])
+    with pytest.raises(SessionNotFound):
+        store.get(session.id)
+    assert store.stats()['sessions'] == 0
+
+
+def test_concurrent_edits_are_serialized(tmp_path):
+    # Each edit reads, changes and writes the session; without the lock
+    # file, edits from different stores would overwrite each other
+    stores = [SessionStore(directory=str(tmp_path)) for _ in range(4)]
+    session = stores[0].create([None])
+
+    def edit(store, bar):
+        for shift in (1, -1) * 5:
+            store.edit(session.id, [{'bar': bar, 'notes': C_MAJOR}, {'bar': bar, 'shift': shift}])
+
+    threads = [threading.Thread(target=edit, args=(store, i + 1)) for i, store in enumerate(stores)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    final = stores[0].get(session.id)
+    assert final.version == 40
+    assert final.bars[1:] == [(-12, -8, -5)] * 4
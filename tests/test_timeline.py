@@ -0,0 +1,30 @@
+import numpy as np
+
+from audio_cache import AudioCache
+from audio_utils import normalize, to_pcm16
+from harmonizer import Note
+from timeline import Event, Timeline, Track, render_timeline_audio
+
+
+def make_timeline(length=3.0):
+    return Timeline([
+        Track([Event([Note('C', 0), Note('G', 0)], 0.5, length, 0.7)], waveform='pwm', pan=0.3),
+        Track([Event([Note('E', 0)], 1.25, 2.0)], waveform='square', volume=0.4),
+    ], tempo=97)
+
+
+def test_streamed_audio_matches_whole_mix():
+    timeline = make_timeline()
+    expected = to_pcm16(normalize(timeline.render()))
+    data = render_timeline_audio(timeline)
+    assert np.array_equal(np.frombuffer(data[44:], dtype=np.int16).reshape(-1, 2), expected)
+
+
+def test_long_events_bypass_the_cache():
+    cache = AudioCache(max_bytes=64 * 1024 * 1024)
+    # 40 beats at 97 BPM is about 25 seconds
+    timeline = make_timeline(length=40)
+    cached = timeline.render(cache=cache)
+    assert cache.stats()['entries'] == 1  # Only the short square event
+    assert np.allclose(cached, timeline.render(), atol=1e-5)
+
@@ -0,0 +1,321 @@
+"""
+Multi-track timelines and a block-wise mixing engine.
+
+A timeline holds tracks, each with its own waveform, volume and pan, and
+each track holds events: chords that start at any beat and last any number
+of beats. Beats are quarter notes at the timeline's tempo; time signatures
+only decide where bars fall, so events can also be placed by bar.
+
+Rendering walks the timeline one block of frames at a time and sums every
+event sounding in the block into a shared stereo bus, so memory depends on
+the block size and not on the number of tracks, events or their length.
+Audio files are normalized to the peak of the whole mix, found in a first
+pass, and encoded block by block in a second.
+"""
+
+import math
+import numpy as np
+
+import audio_utils
+import flac
+import metrics
+import oscillators
+from audio_utils import OUTPUT_FORMATS, to_pcm16, wav_header
+from harmonizer import Note
+
+BLOCK_SIZE = flac.BLOCK_SIZE  # Frames per bus block, one FLAC frame each
+MAX_TRACKS = 64
+MAX_DURATION = 20 * 60.0  # Seconds
+# Events up to this long are rendered whole through the cache when one is
+# given; longer ones are synthesized block by block
+MAX_CACHED_EVENT_SECONDS = 8.0
+
+
+class Event:
+    """A chord starting at beat `start` and lasting `length` beats."""
+
+    def __init__(self, notes, start, length, velocity=1.0):
+        if not notes:
+            raise ValueError("Events need at least one note")
+        if len(notes) > oscillators.MAX_CHORD_SIZE:
+            raise ValueError(f"Events can have at most {oscillators.MAX_CHORD_SIZE} notes")
+        if start < 0 or length <= 0:
+            raise ValueError("Events must start at or after beat 0 and have a positive length")
+        self.notes = list(notes)
+        self.start = float(start)
+        self.length = float(length)
+        self.velocity = float(velocity)
+
+    @property
+    def end(self):
+        return self.start + self.length
+
+
+class Track:
+    """
+    Events played with one waveform, volume and pan (-1 left to 1 right).
+
+    Notes of an event are averaged, as in a sequence bar, then scaled by
+    the event's velocity and the track's volume.
+    """
+
+    def __init__(self, events=(), waveform='sine', volume=1.0, pan=0.0, name=None):
+        oscillators.check_waveform(waveform)
+        if not -1 <= pan <= 1:
+            raise ValueError("Pan must be between -1 and 1")
+        if volume < 0:
+            raise ValueError("Volume cannot be negative")
+        self.events = list(events)
+        self.waveform = waveform
+        self.volume = float(volume)
+        self.pan = float(pan)
+        self.name = name
+
+    def gains(self):
+        """(left, right) gains: the volume with a constant-power pan law."""
+        angle = (self.pan + 1) * np.pi / 4
+        return self.volume * np.cos(angle), self.volume * np.sin(angle)
+
+
+class Timeline:
+    """
+    Tracks at a fixed tempo (quarter notes per minute).
+
+    `time_signatures` is a list of (bar, numerator, denominator) changes,
+    the first at bar 0; the default is 4/4 throughout. The timeline lasts
+    `length` beats, or until its last event ends.
+    """
+
+    def __init__(self, tracks=(), tempo=120, time_signatures=None, length=None):
+        if tempo <= 0:
+            raise ValueError("Tempo must be positive")
+        signatures = sorted(tuple(int(v) for v in signature) for signature in time_signatures or [(0, 4, 4)])
+        if signatures[0][0] != 0:
+            raise ValueError("The first time signature must start at bar 0")
+        if any(numerator <= 0 or denominator <= 0 for _, numerator, denominator in signatures):
+            raise ValueError("Time signatures must be positive")
+        self.tracks = list(tracks)
+        self.tempo = float(tempo)
+        self.time_signatures = signatures
+        self.length = length
+        if len(self.tracks) > MAX_TRACKS:
+            raise ValueError(f"Timelines can have at most {MAX_TRACKS} tracks")
+        if self.duration() > MAX_DURATION:
+            raise ValueError(f"Timelines can last at most {MAX_DURATION / 60:g} minutes")
+
+    @classmethod
+    def from_dict(cls, data):
+        """
+        Build a timeline from a JSON payload:
+
+            {"tempo": 120, "time_signatures": [[0, 4, 4], [8, 6, 8]],
+             "tracks": [{"waveform": "sine", "volume": 0.8, "pan": -0.5,
+                         "events": [{"notes": [{"name": "C", "octave": 0}],
+                                     "start": 0, "length": 4}]}]}
+
+        Events are placed by `start` beat, or by `bar` and an optional
+        `beat` within it (counted in the bar's time signature unit).
+        """
+        timeline = cls(
+            tempo=data.get('tempo', 120),
+            time_signatures=data.get('time_signatures'),
+            length=data.get('length')
+        )
+        for track_data in data.get('tracks', []):
+            events = []
+            for event_data in track_data.get('events', []):
+                if 'start' in event_data:
+                    start = float(event_data['start'])
+                else:
+                    start = timeline.position(int(event_data['bar']), float(event_data.get('beat', 0)))
+                events.append(Event(
+                    [Note(note['name'], note['octave']) for note in event_data['notes']],
+                    start,
+                    float(event_data['length']),
+                    float(event_data.get('velocity', 1.0))
+                ))
+            timeline.tracks.append(Track(
+                events,
+                waveform=track_data.get('waveform', 'sine'),
+                volume=float(track_data.get('volume', 1.0)),
+                pan=float(track_data.get('pan', 0.0)),
+                name=track_data.get('name')
+            ))
+        # Re-validate now that the tracks are in place
+        return cls(timeline.tracks, timeline.tempo, timeline.time_signatures, timeline.length)
+
+    def position(self, bar, beat=0.0):
+        """Beat at which `beat` (in the time signature's unit) of `bar` falls."""
+        position = 0.0
+        for i, (start_bar, numerator, denominator) in enumerate(self.time_signatures):
+            next_bar = self.time_signatures[i + 1][0] if i + 1 < len(self.time_signatures) else None
+            unit = 4.0 / denominator
+            if next_bar is None or bar < next_bar:
+                return position + (bar - start_bar) * numerator * unit + beat * unit
+            position += (next_bar - start_bar) * numerator * unit
+        return position
+
+    def length_beats(self):
+        if self.length is not None:
+            return float(self.length)
+        return max((event.end for track in self.tracks for event in track.events), default=0.0)
+
+    def duration(self):
+        """Length in seconds."""
+        return self.length_beats() * 60.0 / self.tempo
+
+    def frames(self, sample_rate=44100):
+        return int(round(self.duration() * sample_rate))
+
+    def render_blocks(self, sample_rate=44100, block_size=BLOCK_SIZE, cache=None):
+        """
+        Render the timeline one bus block at a time.
+
+        Yields (start frame, block) pairs, where `block` is a float32
+        (frames, 2) buffer that is reused for the next block. Blocks are
+        unnormalized: each event's notes peak at velocity x volume.
+
+        With a `cache` (see audio_utils.render_bar), each distinct event
+        (notes, waveform and length) up to MAX_CACHED_EVENT_SECONDS long is
+        synthesized once and then copied, which pays off when material
+        repeats; memory then also includes the cached events, bounded by
+        the cache.
+        """
+        total = self.frames(sample_rate)
+        seconds_per_beat = 60.0 / self.tempo
+
+        # (start frame, end frame, track, event), in order of start
+        spans = [
+            (
+                int(round(event.start * seconds_per_beat * sample_rate)),
+                min(int(round(event.end * seconds_per_beat * sample_rate)), total),
+                index,
+                event
+            )
+            for index, track in enumerate(self.tracks)
+            for event in track.events
+        ]
+        spans.sort(key=lambda span: span[0])
+        gains = [np.array(track.gains(), dtype=np.float32) for track in self.tracks]
+
+        mixer = _Mixer(block_size, sample_rate, seconds_per_beat, cache)
+        bus = np.empty((block_size, 2), dtype=np.float32)
+        active = []
+        next_span = 0
+        for block_start in range(0, total, block_size):
+            block_stop = min(block_start + block_size, total)
+            output = bus[:block_stop - block_start]
+            output[:] = 0
+
+            while next_span < len(spans) and spans[next_span][0] < block_stop:
+                active.append(spans[next_span])
+                next_span += 1
+            active = [span for span in active if span[1] > block_start]
+
+            with metrics.stage('synthesize'):
+                for start, end, index, event in active:
+                    # The part of the event inside this block
+                    first = max(start, block_start)
+                    last = min(end, block_stop)
+                    if first < last:
+                        mixer.add(self.tracks[index], event, gains[index], first - start,
+                                  output[first - block_start:last - block_start])
+            yield block_start, output
+
+    def render(self, sample_rate=44100, block_size=BLOCK_SIZE, cache=None):
+        """The whole timeline as an unnormalized float32 (frames, 2) array."""
+        output = np.empty((self.frames(sample_rate), 2), dtype=np.float32)
+        for start, block in self.render_blocks(sample_rate, block_size, cache):
+            output[start:start + len(block)] = block
+        return output
+
+    def peak(self, sample_rate=44100, block_size=BLOCK_SIZE, cache=None):
+        """Largest absolute sample of the unnormalized mix."""
+        peak = 0.0
+        for _, block in self.render_blocks(sample_rate, block_size, cache):
+            if len(block):
+                peak = max(peak, float(np.abs(block).max()))
+        return peak
+
+
+class _Mixer:
+    """Adds parts of events to the bus, with scratch buffers for one block."""
+
+    def __init__(self, block_size, sample_rate, seconds_per_beat, cache=None):
+        self.sample_rate = sample_rate
+        self.seconds_per_beat = seconds_per_beat
+        self.cache = cache
+        self.max_cached_beats = MAX_CACHED_EVENT_SECONDS / seconds_per_beat
+        self.voice = np.empty((block_size, 2), dtype=np.float32)
+        self.mono = np.empty(block_size, dtype=np.float32)
+
+    def add(self, track, event, gains, offset, out):
+        """Add frames `offset` onward of an event, panned, to `out`."""
+        frames = len(out)
+        voice = self.voice[:frames]
+        if self.cache is not None and event.length <= self.max_cached_beats:
+            # Both ends of a span are rounded to whole frames, so events are
+            # rendered to the next whole frame to cover any span they fill
+            length = math.ceil(event.length * self.seconds_per_beat * self.sample_rate)
+            samples = audio_utils.render_bar(
+                event.notes, (length + 0.5) / self.sample_rate, self.sample_rate, track.waveform, self.cache
+            )
+            np.multiply(samples[offset:offset + frames], gains * np.float32(event.velocity), out=voice)
+            out += voice
+            return
+
+        frequencies = [note.frequency for note in event.notes]
+        gain = event.velocity / len(frequencies)
+        if track.waveform == 'pwm':
+            # Detuned left lower and right higher
+            for channel, channel_frequencies in enumerate(oscillators.pwm_channels(frequencies)):
+                oscillators.mix(channel_frequencies, out[:, channel], self.sample_rate, 'pwm',
+                                gain=gain * gains[channel], offset=offset)
+            return
+        # Mono voices are rendered once into a contiguous scratch, then panned
+        mono = self.mono[:frames]
+        mono[:] = 0
+        oscillators.mix(frequencies, mono, self.sample_rate, track.waveform, gain=gain, offset=offset)
+        np.multiply(mono[:, None], gains, out=voice)
+        out += voice
+
+
+def stream_timeline_audio(timeline, sample_rate=44100, fmt='wav', cache=None, peak=None):
+    """
+    Render a timeline as a normalized stereo audio file, in chunks.
+
+    Yields the WAV header (or FLAC header) and then one chunk per block,
+    so memory stays at a few blocks however long the timeline is. Blocks
+    are scaled by 1 / `peak`, which is found in a first rendering pass
+    unless given.
+    """
+    if fmt not in OUTPUT_FORMATS:
+        raise ValueError(f"Invalid format: {fmt}. Must be one of {OUTPUT_FORMATS}")
+    if peak is None:
+        peak = timeline.peak(sample_rate, cache=cache)
+    scale = np.float32(1 / peak if peak > 0 else 1)
+    total = timeline.frames(sample_rate)
+
+    header = flac.stream_header(sample_rate, 2, total) if fmt == 'flac' else wav_header(total, sample_rate, 2)
+    size = len(header)
+    yield header
+    blocks = timeline.render_blocks(sample_rate, BLOCK_SIZE, cache)
+    for number, (_, block) in enumerate(blocks):
+        with metrics.stage('encode'):
+            block *= scale
+            pcm = to_pcm16(block, in_place=True)
+            chunk = flac.encode_frame(pcm, number) if fmt == 'flac' else pcm.tobytes()
+        size += len(chunk)
+        yield chunk
+    metrics.encoded_bytes.observe(size, format=fmt)
+
+
+def render_timeline_audio(timeline, sample_rate=44100, fmt='wav', cache=None):
+    """
+    Render a timeline as a normalized stereo audio file.
+
+    Returns WAV (or FLAC) file bytes, or None if the timeline is empty.
+    """
+    if timeline.duration() <= 0:
+        return None
+    return b''.join(stream_timeline_audio(timeline, sample_rate, fmt, cache))